@@ -1,7 +1,12 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import (
+    StreamingResponse,
+    JSONResponse,
+    PlainTextResponse,
+    FileResponse,
+)
 from pydantic import BaseModel, UUID4
 from typing import Optional, Dict, Any, AsyncGenerator
 from datetime import datetime
@@ -11,18 +16,36 @@ from app.schemas import UserCreate, UserRead, UserUpdate
 from app.users import auth_backend, current_active_user, fastapi_users
 from app import cmd
 from app import target
+from app import log_tail
+from app import log_index
+from app import readiness
+from app import jobs
+from app import sync
+from app import deployments
+from app import metrics
+from app import capture
+from app import history
+from app import users
+from app import db as database
+from app.jobs import job_queue
+from app.log_hub import LogHub
+from app.status import StatusCache
+from app.target_config import target_configs
+from app.procs import process_index
+from app.target_locks import TargetBusy, target_locks
 from sqlalchemy import select
 from app.db import get_async_session
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.target import Target, get_target_db
 from uuid import UUID
-from time import time
+from time import time, monotonic
 
 import subprocess
 import asyncio
 import os
 import json
 import logging
+import re
 import sys
 
 logging.basicConfig(
@@ -32,12 +55,58 @@ logging.basicConfig(
     handlers=[logging.StreamHandler(sys.stdout)],
 )
 
+config_path = os.path.join(os.path.dirname(__file__), "../../config.json")
+with open(config_path) as config_file:
+    server_config = json.load(config_file)
+
+logs_config = server_config["backend"].get("logs", {})
+log_hub = LogHub(
+    backlog=logs_config.get("backlog_lines", 100),
+    queue_size=logs_config.get("subscriber_queue_size", 1000),
+)
+log_indexes = log_index.LogIndexRegistry(
+    max_files=logs_config.get("max_indexed_files", 8),
+    max_postings=logs_config.get(
+        "max_postings_per_file", log_index.DEFAULT_MAX_POSTINGS
+    ),
+)
+
+status_cache = StatusCache(
+    ttl=server_config["backend"].get("status", {}).get("cache_ttl", 5)
+)
+
+processes_config = server_config["backend"].get("processes", {})
+deployment_config = server_config["backend"].get("deployment", {})
+ready_config = {
+    "marker": deployment_config.get("ready_marker"),
+    "timeout": deployment_config.get("ready_timeout", 120),
+    "interval": deployment_config.get("ready_poll_interval", 1),
+    "fallback_delay": deployment_config.get("ready_fallback_delay", 20),
+}
+
+LOG_FILES = {
+    "engine": "server/logs/engine.log",
+    "nohup": "server/nohup.out",
+    "co_engine": "server/output.log",
+}
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Not needed if you setup a migration system like Alembic
+    metrics.instrument_engine(database.engine)
+    capture_pruner = asyncio.create_task(capture.prune_periodically())
     await create_db_and_tables()
+    await users.token_cache.prune()
+    await history.run_recorder.start()
+    await job_queue.start()
     yield
+    await job_queue.stop()
+    capture_pruner.cancel()
+    await history.run_recorder.stop()
+    cmd.ssh_pool.close_all()
+    cmd.ssh_executor.shutdown(wait=False)
+    await log_hub.close()
 
 
 app = FastAPI(
@@ -49,6 +118,8 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -64,6 +135,7 @@ app.add_middleware(
     allow_credentials=True,  # This requires specific origins, not "*"
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],  # GET /targets paging
 )
 
 app.include_router(
@@ -95,6 +167,34 @@ app.include_router(
 app.include_router(
     target.router, tags=["targets"], dependencies=[Depends(current_active_user)]
 )
+app.include_router(
+    jobs.router, tags=["jobs"], dependencies=[Depends(current_active_user)]
+)
+app.include_router(
+    history.router, tags=["history"], dependencies=[Depends(current_active_user)]
+)
+
+
+metrics.Gauge(
+    "cmdserver_log_stream_subscribers",
+    "Clients currently following a log stream",
+    log_hub.subscriber_count,
+)
+metrics.Gauge(
+    "cmdserver_ssh_sessions_in_use",
+    "SSH sessions checked out of the connection pool",
+    cmd.ssh_pool.sessions_in_use,
+)
+metrics.Gauge(
+    "cmdserver_token_cache_entries",
+    "Tokens held in this worker's in-process token cache",
+    lambda: len(users.token_cache),
+)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
 @app.get("/authenticated-route")
@@ -119,35 +219,17 @@ class LogStreamRequest(BaseModel):
 async def get_deployment_config(
     target_id: UUID, db: AsyncSession = Depends(get_async_session)
 ):
+    config = target_configs.get(target_id)
+    if config is not None:
+        return config
+
     stmt = select(Target).where(Target.id == target_id)
     result = await db.execute(stmt)
     db_target = result.scalar_one_or_none()
     if db_target is None:
         raise HTTPException(status_code=404, detail="Target not found")
-    logging.info(f"Using server path: {db_target.server_path}")
     try:
-        config_file_path = db_target.server_path + "/atomiton.env"
-        if not os.path.exists(config_file_path):
-            config_file_path = "./atomiton.env"
-        with open(config_file_path, "r") as f:
-            lines = f.readlines()
-            logging.info("Config Env:   ", lines[1].strip())
-            logging.info("Config Port:  ", lines[3].strip())
-            logging.info("Config Source:", lines[5].strip())
-            return {
-                "Target": {
-                    "server_name": db_target.name,
-                    "server_tag": db_target.server_tag,
-                    "server_alias": db_target.server_alias,
-                    "server_path": db_target.server_path,
-                    "server_port": db_target.server_port,
-                    "server_role": db_target.server_role,
-                },
-                "env": lines[1].strip(),
-                "port": lines[3].strip(),
-                "source": lines[11].strip(),
-                "database": lines[5].strip(),
-            }
+        return target_configs.load(db_target)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read config: {str(e)}")
 
@@ -163,36 +245,260 @@ async def execute_command(
             "message": "Command execution is disabled",
             "command": command,
         }
+    # Output beyond the in-memory window goes to a gzip file under output_id
+    output_id = capture.new_output_id()
+    stdout = capture.OutputCapture(output_id, "stdout")
+    stderr = capture.OutputCapture(output_id, "stderr")
     try:
-        process = await asyncio.create_subprocess_shell(
-            command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=cwd,
-        )
-        stdout, stderr = await process.communicate()
+        with metrics.track_subprocess():
+            process = await asyncio.create_subprocess_shell(
+                command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=cwd,
+            )
+            try:
+                await asyncio.gather(
+                    capture_stream(process.stdout, stdout),
+                    capture_stream(process.stderr, stderr),
+                )
+                await process.wait()
+            finally:
+                await stdout.close()
+                await stderr.close()
         logging.info(f"[CMD Status]: {process.returncode}")
-        if stdout:
-            logging.info(f"[CMD Output]: {stdout.decode()}")
-        return {
+        result = {
             "success": process.returncode == 0,
-            "stdout": stdout.decode(),
-            "stderr": stderr.decode(),
+            "stdout": stdout.preview(),
+            "stderr": stderr.preview(),
             "return_code": process.returncode,
+            "stdout_bytes": stdout.total,
+            "stderr_bytes": stderr.total,
         }
+        if result["stdout"]:
+            logging.info(f"[CMD Output]: {result['stdout']}")
+        spilled = [output.stream for output in (stdout, stderr) if output.spilled]
+        if spilled:
+            result["truncated"] = spilled
+            result["output_id"] = output_id
+        return result
     except Exception as e:
         logging.info(f"[CMD Error]: {str(e)}")
         return {"success": False, "error": str(e), "return_code": -1}
 
 
+async def capture_stream(reader: asyncio.StreamReader, output: capture.OutputCapture):
+    while True:
+        chunk = await reader.read(65536)
+        if not chunk:
+            break
+        await output.feed(chunk)
+
+
+# Full output of a command whose response only carried a preview
+@app.get("/api/outputs/{output_id}/{stream}")
+async def download_output(
+    output_id: str, stream: str, current_user=Depends(current_active_user)
+):
+    path = capture.output_path(output_id, stream)
+    if path is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Output not found")
+    return FileResponse(
+        path, media_type="application/gzip", filename=os.path.basename(path)
+    )
+
+
+# Runs commands in order like `a && b && c`, recording each step's start time,
+# duration, exit code and output size. Every step runs in its own shell behind
+# the `cd` steps that succeeded before it, so a `cd` (with `~`, quoting or
+# `cd -`) sets the working directory of the later steps as it would inside one
+# shell.
+async def run_pipeline(
+    commands, execute: bool = True, cwd: Optional[str] = None, stop_on_failure=True
+) -> Dict[str, Any]:
+    started = monotonic()
+    steps = []
+    stdout, stderr = [], []
+    success, return_code = True, 0
+    cd_prefix = ""
+    for command in commands:
+        await jobs.step(command)
+        step_started = datetime.now()
+        step_clock = monotonic()
+        result = await execute_command(f"{cd_prefix}{command}", execute, cwd)
+        if result["success"] and (command == "cd" or command.startswith("cd ")):
+            cd_prefix += f"{command} >/dev/null && "
+
+        out = result.get("stdout", "")
+        err = result.get("stderr", result.get("error", ""))
+        step = {
+            "command": command,
+            "started_at": step_started.isoformat(),
+            "elapsed": round(monotonic() - step_clock, 3),
+            "return_code": result.get("return_code"),
+            "success": result["success"],
+            "stdout_bytes": result.get("stdout_bytes", len(out.encode())),
+            "stderr_bytes": result.get("stderr_bytes", len(err.encode())),
+        }
+        if "output_id" in result:
+            step["output_id"] = result["output_id"]
+        steps.append(step)
+        await jobs.finish_step(
+            "succeeded" if result["success"] else "failed",
+            return_code=step["return_code"],
+            stdout_bytes=step["stdout_bytes"],
+            stderr_bytes=step["stderr_bytes"],
+        )
+        stdout.append(out)
+        stderr.append(err)
+        if not result["success"]:
+            success, return_code = False, result.get("return_code", -1)
+            if stop_on_failure:
+                break
+
+    elapsed = round(monotonic() - started, 3)
+    slowest = max(steps, key=lambda step: step["elapsed"], default=None)
+    if slowest:
+        logging.info(
+            f"[Pipeline]: {len(steps)} steps in {elapsed}s, slowest {slowest['elapsed']}s: {slowest['command']}"
+        )
+    result = {
+        "success": success,
+        "return_code": return_code,
+        "stdout": "".join(stdout),
+        "stderr": "".join(stderr),
+        "steps": steps,
+        "elapsed": elapsed,
+    }
+    if not execute:
+        result["message"] = "Command execution is disabled"
+    return result
+
+
+# A pipeline-style step record for work that is not a shell command
+def step_record(name: str, started_at: datetime, clock: float, success: bool):
+    return {
+        "command": name,
+        "started_at": started_at.isoformat(),
+        "elapsed": round(monotonic() - clock, 3),
+        "return_code": None,
+        "success": success,
+        "stdout_bytes": None,
+        "stderr_bytes": None,
+    }
+
+
+# Stops engine processes found in the process index: SIGTERM, then SIGKILL after
+# the grace period, so a restart never races the old engine
+async def stop_processes(procs, execute: bool = True) -> Dict[str, Any]:
+    pids = [proc.pid for proc in procs]
+    logging.info(f"[Stop]: {pids}")
+    if not execute:
+        return {
+            "success": True,
+            "message": "Command execution is disabled",
+            "pids": pids,
+        }
+    return await process_index.terminate(
+        procs, grace=processes_config.get("kill_grace_period", 10)
+    )
+
+
+# Fetches the repository and resolves `ref` to the commit it would deploy
+async def fetch_commit(repo_path: str, ref: str, execute: bool = True):
+    commands = [
+        f"cd {repo_path}",
+        "git fetch",
+        f"git rev-parse --verify '{ref}^{{commit}}'",
+    ]
+    result = await run_pipeline(commands, execute)
+    lines = result.get("stdout", "").strip().splitlines()
+    commit = lines[-1] if result["success"] and lines else None
+    return result, commit
+
+
+# Deploys a component only when the fetched commit differs from the one already
+# deployed to the target, unless `force` is set
+async def deploy_if_changed(
+    target_id,
+    component: str,
+    repo_path: str,
+    ref: str,
+    deploy,
+    execute: bool = False,
+    force: bool = False,
+) -> Dict[str, Any]:
+    fetch_result, commit = await fetch_commit(repo_path, ref, execute)
+    if not fetch_result["success"]:
+        return {
+            **fetch_result,
+            "message": f"Failed to fetch {component} source: {fetch_result['stderr']}",
+        }
+
+    if commit and not force:
+        if commit == await deployments.deployed_commit(target_id, component):
+            logging.info(f"[Deploy] {component} already at {commit}, skipping")
+            return {
+                "message": f"{component} is already deployed at {commit[:7]}",
+                "success": True,
+                "skipped": True,
+                "commit": commit,
+                "steps": fetch_result["steps"],
+            }
+
+    result = await deploy()
+    steps = fetch_result["steps"] + result.get("steps", [])
+    if result["success"] and commit:
+        await deployments.record_deployed_commit(
+            target_id, component, commit, timings=steps
+        )
+    return {**result, "skipped": False, "commit": commit, "steps": steps}
+
+
+@app.get("/api/deployment/deployed-commits")
+async def get_deployed_commits(
+    target_id: UUID, current_user=Depends(current_active_user)
+):
+    return await deployments.deployed_commits(target_id)
+
+
+# Runs a deployment action under its target's lock and records it in the run
+# history; identical concurrent calls share one run, and a conflicting call
+# waits or gets a 409 when wait=False
+async def run_exclusive(
+    target_id,
+    operation: str,
+    params: Dict[str, Any],
+    factory,
+    wait: bool = True,
+    user=None,
+):
+    try:
+        return await target_locks.run(
+            target_id,
+            operation,
+            params,
+            lambda: history.track(target_id, operation, factory, user=user),
+            wait,
+        )
+    except TargetBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/api/deployment/locks")
+async def view_deployment_locks(current_user=Depends(current_active_user)):
+    return target_locks.stats()
+
+
 # 1. Pull Backend Source
 @app.get("/api/deployment/pull-be-source")
 async def pull_be_source(
     target_id: UUID,
-    background_tasks: BackgroundTasks,
     commit_id: Optional[str] = None,
     execute: bool = False,
     asynchronous: bool = False,
+    wait: bool = True,
+    force: bool = False,
     current_user=Depends(current_active_user),
 ):
     logging.info("Deploy the latest Backend commit")
@@ -205,77 +511,139 @@ async def pull_be_source(
                 f"Source Path: {source_path}, Commit ID: {commit_id}, Execute: {execute}, asynchronous: {asynchronous}"
             )
 
-            commands = [
-                f"cd {source_path}/source_code/atprofveolia/",
-                "git reset --hard",  # Reset to the latest commit
-                "git fetch",
-                f"git checkout {commit_id}" if commit_id else "git checkout dev",
-                f"sleep 2" if commit_id else "git pull",
-                f"cd {source_path}",
-                "mkdir -p source_code/temp_backend",
-                f"rsync -av {source_path}/source_code/atprofveolia/server/ {source_path}/source_code/temp_backend/",
-                "rm -rf source_code/temp_backend/sff.sqldb.data/*",
-                "rm -rf source_code/temp_backend/sff.auto.launch/*",
-                "rm -rf source_code/temp_backend/spaces/reports/*",
-                "rm -rf source_code/temp_backend/ui/*",
-                "rm -rf source_code/temp_backend/config/*",
-                "rm -rf source_code/temp_backend/spaces/*",
-                f"cd {source_path}/source_code/temp_backend",
-                "rm -f *.log *.out *.sh *.cdm, *.py *.jar *.xml *.txt",
-                "rm -f sff.auto.config.cdm sff.auto.config.DEBUG.cdm sff.auto.config.docker.cdm",
-                f"rsync -av {source_path}/source_code/temp_backend/ {source_path}/server/",
-                f"cd {source_path}",
-            ]
-            command = " && ".join(commands)
-            pull_result = await execute_command(command, execute=execute)
-
-            if pull_result["success"]:
-                if asynchronous:
-                    background_tasks.add_task(
-                        restart_server_task,
-                        source_path=source_path,
-                        execute=execute,
-                        current_user=current_user,
-                    )
-                    return {
-                        "message": "Backend source updated successfully",
-                        "path": source_path,
-                        "success": True,
-                        "details": {
-                            "pull": pull_result,
-                            "restart": "waiting for background task",
-                        },
-                    }
-                else:
-                    restart_result = await restart_server_task(
-                        source_path=source_path,
-                        execute=execute,
-                        current_user=current_user,
-                    )
-
-            else:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Failed to update backend source: {pull_result.get('stderr', pull_result.get('error'))}",
+            params = {
+                "target_id": target_id,
+                "source_path": source_path,
+                "commit_id": commit_id,
+                "execute": execute,
+                "server_port": config["Target"]["server_port"],
+                "force": force,
+            }
+            if asynchronous:
+                job = await job_queue.submit(
+                    "pull-be", params, target_id=target_id, user=current_user
                 )
+                return {
+                    "message": "Backend deployment queued",
+                    "path": source_path,
+                    "success": True,
+                    "job": job,
+                }
 
-            return {
-                "message": "Backend source updated successfully",
-                "path": source_path,
-                "success": True,
-                "details": {"pull": pull_result, "restart": restart_result},
-            }
+            result = await run_exclusive(
+                target_id,
+                "pull-be",
+                params,
+                lambda: pull_be_task(**params),
+                wait,
+                user=current_user,
+            )
+            if not result["success"]:
+                raise HTTPException(status_code=500, detail=result["message"])
+            return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
+async def pull_be_task(
+    target_id,
+    source_path: str,
+    commit_id: Optional[str] = None,
+    execute: bool = False,
+    server_port: Optional[str] = None,
+    force: bool = False,
+):
+    return await deploy_if_changed(
+        target_id,
+        "backend",
+        f"{source_path}/source_code/atprofveolia",
+        commit_id or "origin/dev",
+        lambda: deploy_backend(source_path, commit_id, execute, server_port),
+        execute=execute,
+        force=force,
+    )
+
+
+async def deploy_backend(
+    source_path: str,
+    commit_id: Optional[str] = None,
+    execute: bool = False,
+    server_port: Optional[str] = None,
+):
+    commands = [
+        f"cd {source_path}/source_code/atprofveolia/",
+        "git reset --hard",  # Reset to the latest commit
+        f"git checkout {commit_id}" if commit_id else "git checkout dev",
+        f"sleep 2" if commit_id else "git pull",
+    ]
+    pull_result = await run_pipeline(commands, execute=execute)
+    steps = list(pull_result["steps"])
+
+    if not pull_result["success"]:
+        return {
+            "message": f"Failed to update backend source: {pull_result['stderr']}",
+            "path": source_path,
+            "success": False,
+            "steps": steps,
+            "details": {"pull": pull_result},
+        }
+
+    # Copy the checkout into server/ in one pass, skipping unchanged files
+    await jobs.step("sync backend files")
+    started_at, clock = datetime.now(), monotonic()
+    sync_result = await asyncio.to_thread(sync.sync_backend, source_path, execute)
+    await jobs.finish_step("succeeded" if sync_result["success"] else "failed")
+    steps.append(
+        step_record("sync backend files", started_at, clock, sync_result["success"])
+    )
+    status_cache.invalidate(source_path)
+
+    if not sync_result["success"]:
+        return {
+            "message": f"Failed to sync backend source: {sync_result.get('error')}",
+            "path": source_path,
+            "success": False,
+            "steps": steps,
+            "details": {"pull": pull_result, "sync": sync_result},
+        }
+
+    started_at, clock = datetime.now(), monotonic()
+    restart_result = await restart_server_task(
+        source_path=source_path,
+        execute=execute,
+        server_port=server_port,
+    )
+    steps.append(
+        step_record("restart engine", started_at, clock, restart_result["success"])
+    )
+    return {
+        "message": (
+            "Backend source updated successfully"
+            if restart_result["success"]
+            else f"Backend source updated but the restart failed: {restart_result['message']}"
+        ),
+        "path": source_path,
+        "success": restart_result["success"],
+        "steps": steps,
+        "details": {
+            "pull": pull_result,
+            "sync": sync_result,
+            "restart": restart_result,
+        },
+    }
+
+
 # 3. Pull UI Source
 @app.get("/api/deployment/pull-ui-source")
 async def pull_ui_source(
     target_id: UUID,
     commit_id: Optional[str] = None,
     execute: bool = False,
+    wait: bool = True,
+    force: bool = False,
     current_user=Depends(current_active_user),
 ):
     logging.info("Deploy the latest UI commit")
@@ -287,7 +655,6 @@ async def pull_ui_source(
             commands = [
                 f"cd {source_path}/source_code/atprofveoliaui/",
                 "git reset --hard",  # Reset to the latest commit
-                "git fetch",
                 f"git checkout {commit_id}" if commit_id else "git checkout build",
                 f"sleep 2" if commit_id else "git pull",
                 f"cd {source_path}",
@@ -299,15 +666,39 @@ async def pull_ui_source(
                 f"cd {source_path}",
             ]
 
-            command = " && ".join(commands)
-            result = await execute_command(command, execute)
+            result = await run_exclusive(
+                target_id,
+                "pull-ui",
+                {"commands": commands, "execute": execute, "force": force},
+                lambda: deploy_if_changed(
+                    target_id,
+                    "ui",
+                    f"{source_path}/source_code/atprofveoliaui",
+                    commit_id or "origin/build",
+                    lambda: run_pipeline(commands, execute),
+                    execute=execute,
+                    force=force,
+                ),
+                wait,
+                user=current_user,
+            )
+            status_cache.invalidate(source_path)
 
             if result["success"]:
                 return {
-                    "message": "Frontend source updated successfully",
+                    "message": (
+                        result["message"]
+                        if result["skipped"]
+                        else "Frontend source updated successfully"
+                    ),
                     "path": source_path,
                     "success": True,
-                    "details": {"pull": command},
+                    "skipped": result["skipped"],
+                    "commit": result["commit"],
+                    "details": {
+                        "pull": " && ".join(commands),
+                        "steps": result["steps"],
+                    },
                 }
             else:
                 raise HTTPException(
@@ -315,6 +706,8 @@ async def pull_ui_source(
                     detail=f"Failed to update Frontend source: {result.get('stderr', result.get('error'))}",
                 )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
@@ -323,7 +716,6 @@ async def pull_ui_source(
 @app.get("/api/deployment/re-schema")
 async def re_schema(
     target_id: UUID,
-    background_tasks: BackgroundTasks,
     current_user=Depends(current_active_user),
 ):
     logging.info("Execute re-schema process")
@@ -333,8 +725,17 @@ async def re_schema(
             source_path = config["source"]
 
             # This is a complex operation that should run in background
-            background_tasks.add_task(execute_reschema_process, source_path)
-            return {"message": "Re-schema process started", "status": "processing"}
+            job = await job_queue.submit(
+                "reschema",
+                {"source_path": source_path},
+                target_id=target_id,
+                user=current_user,
+            )
+            return {
+                "message": "Re-schema process started",
+                "status": "processing",
+                "job": job,
+            }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
@@ -351,17 +752,20 @@ async def execute_reschema_process(source_path: str, execute: bool = False):
         f"cd {source_path}",
     ]
 
-    for command in commands:
-        await execute_command(command, execute)
+    # Every step runs even if an earlier one failed, so the environment is
+    # always switched back to production
+    result = await run_pipeline(commands, execute, stop_on_failure=False)
+    status_cache.invalidate(source_path)
+    return result
 
 
 # 6. Change Environment and Restart
 @app.get("/api/deployment/change-environment")
 async def change_environment_and_restart(
     target_id: UUID,
-    background_tasks: BackgroundTasks,
     execute: bool = False,
     environment: Optional[str] = None,
+    wait: bool = True,
     current_user=Depends(current_active_user),
 ):
     logging.info("Change environment (development/production) and restart server")
@@ -389,24 +793,39 @@ async def change_environment_and_restart(
             else:
                 change_cmd = f"sed -i '5s/production/development/' {source_path}/server/sff.auto.config.cdm"
 
-            result = await execute_command(change_cmd, execute)
+            result = await run_exclusive(
+                target_id,
+                "change-environment",
+                {"command": change_cmd, "execute": execute},
+                lambda: execute_command(change_cmd, execute),
+                wait,
+                user=current_user,
+            )
+            status_cache.invalidate(source_path)
 
             if result["success"]:
-                background_tasks.add_task(
-                    restart_server_task,
-                    source_path=source_path,
-                    execute=execute,
-                    current_user=current_user,
+                job = await job_queue.submit(
+                    "restart",
+                    {
+                        "source_path": source_path,
+                        "execute": execute,
+                        "server_port": config["Target"]["server_port"],
+                    },
+                    target_id=target_id,
+                    user=current_user,
                 )
                 return {
                     "message": f"Environment changed to {environment}",
                     "status": "restarting",
+                    "job": job,
                 }
             else:
                 raise HTTPException(
                     status_code=500, detail="Failed to change environment"
                 )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
@@ -415,9 +834,9 @@ async def change_environment_and_restart(
 @app.get("/api/deployment/restart-server")
 async def restart_server_endpoint(
     target_id: UUID,
-    background_tasks: BackgroundTasks,
     execute: bool = False,
     asynchronous: bool = False,
+    wait: bool = True,
     current_user=Depends(current_active_user),
 ):
     logging.info("Restart the server")
@@ -426,21 +845,39 @@ async def restart_server_endpoint(
             config = await get_deployment_config(target_id, db)
             source_path = config["source"]
 
+            params = {
+                "source_path": source_path,
+                "execute": execute,
+                "server_port": config["Target"]["server_port"],
+            }
             if asynchronous:
-                background_tasks.add_task(
-                    restart_server_task,
-                    source_path=source_path,
-                    execute=execute,
-                    current_user=current_user,
+                job = await job_queue.submit(
+                    "restart", params, target_id=target_id, user=current_user
                 )
-                return {"message": "Server restart initiated", "status": "restarting"}
+                return {
+                    "message": "Server restart initiated",
+                    "status": "restarting",
+                    "job": job,
+                }
             else:
-                restart_result = await restart_server_task(
-                    source_path=source_path, execute=execute, current_user=current_user
+                restart_result = await run_exclusive(
+                    target_id,
+                    "restart",
+                    params,
+                    lambda: restart_server_task(**params),
+                    wait,
+                    user=current_user,
                 )
+                if not restart_result["success"]:
+                    raise HTTPException(
+                        status_code=500, detail=restart_result["message"]
+                    )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.info(f"Error in restart_server_task: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
     return {
         "message": "Backend source updated successfully",
@@ -450,42 +887,109 @@ async def restart_server_endpoint(
     }
 
 
-# Background task to restart server
+# Restart job; also awaited directly for synchronous restarts
 async def restart_server_task(
     source_path: str = "",
     execute: bool = False,
     current_user=Depends(current_active_user),
+    server_port: Optional[str] = None,
 ):
     logging.info("Background task to restart server")
+    port = int(server_port) if server_port and str(server_port).isdigit() else None
+    log_file = f"{source_path}/server/nohup.out"
 
     # Kill existing process
     logging.info("Killing existing server process")
-    kill_astack_cmd = f"pwdx $(pidof java) 2>/dev/null | grep '{source_path}/server' | cut -d: -f1 | xargs -r kill"
-    kill_astack_result = await execute_command(kill_astack_cmd, execute)
+    await jobs.step("stop engine")
+    kill_astack_result = await stop_processes(
+        await asyncio.to_thread(process_index.engine_processes, source_path), execute
+    )
+    status_cache.invalidate(source_path)
 
     # Kill co_engine process
     logging.info("Killing co_engine process")
-    kill_coengine_cmd = f"ps aux | grep '[p]ython.*{source_path}/pyastackcore' | awk '{{print $2}}' | xargs -r kill"
-    kill_coengine_result = await execute_command(kill_coengine_cmd, execute)
+    kill_coengine_result = await stop_processes(
+        await asyncio.to_thread(process_index.coengine_processes, source_path), execute
+    )
+
+    # The old engine must let go of the port, or it would look ready right away
+    if execute and port:
+        port_closed = await readiness.wait_for_port_closed(
+            port, timeout=ready_config["timeout"]
+        )
+        if not port_closed:
+            # Still held: kill whatever engine is left without another grace period
+            logging.info(f"Port {port} still in use, killing the engine")
+            kill_astack_result["escalated"] = await process_index.terminate(
+                await asyncio.to_thread(process_index.engine_processes, source_path),
+                grace=0,
+            )
+            port_closed = await readiness.wait_for_port_closed(port, timeout=5)
+        if not port_closed:
+            message = f"Port {port} is still in use after stopping the engine"
+            await jobs.finish_step("failed", error=message)
+            status_cache.invalidate(source_path)
+            return {
+                "message": message,
+                "path": source_path,
+                "success": False,
+                "details": {
+                    "kill_astack": kill_astack_result,
+                    "kill_coengine": kill_coengine_result,
+                },
+            }
 
     # Start server
     logging.info("Starting server process")
+    await jobs.step("start engine")
+    if execute:
+        await asyncio.to_thread(readiness.truncate_log, log_file)
     start_astack_cmd = f"cd {source_path}/server/ && nohup java @java-options.txt -jar tql.engine2.4.jar > nohup.out 2>&1 &"
     start_astack_result = await execute_command(start_astack_cmd, execute)
 
-    # Wait and start coengine
-    await asyncio.sleep(20)
+    # Wait for the engine to come up before starting coengine
+    await jobs.step("wait for engine")
+    if not execute:
+        startup = {"ready": False, "method": None, "elapsed": 0}
+    elif port or ready_config["marker"]:
+        startup = await readiness.wait_until_ready(
+            port=port,
+            log_file=log_file,
+            marker=ready_config["marker"],
+            log_offset=0,
+            timeout=ready_config["timeout"],
+            interval=ready_config["interval"],
+        )
+    else:
+        await asyncio.sleep(ready_config["fallback_delay"])
+        startup = {
+            "ready": True,
+            "method": "delay",
+            "elapsed": ready_config["fallback_delay"],
+        }
+    logging.info(f"Engine startup: {startup}")
+    await jobs.finish_step(
+        "succeeded" if startup["ready"] or not execute else "failed",
+        readiness=startup,
+    )
 
     logging.info("Starting co_engine process")
+    await jobs.step("start co_engine")
     coengine_cmd = f"cd {source_path} && nohup python {source_path}/pyastackcore/pyastackcore/co_engine.py > output.log &"
     start_coengine_result = await execute_command(coengine_cmd, execute)
 
+    status_cache.invalidate(source_path)
     logging.info("Server restart task completed")
 
     return {
-        "message": "Engine restarted successfully",
+        "message": (
+            "Engine restarted successfully"
+            if startup["ready"] or not execute
+            else "Engine started but did not become ready in time"
+        ),
         "path": source_path,
-        "success": True,
+        "success": startup["ready"] or not execute,
+        "startup": startup,
         "details": {
             "kill_astack": kill_astack_result,
             "kill_coengine": kill_coengine_result,
@@ -495,6 +999,29 @@ async def restart_server_task(
     }
 
 
+job_queue.register("pull-be", pull_be_task)
+job_queue.register("reschema", execute_reschema_process)
+job_queue.register("restart", restart_server_task)
+
+
+# All log streams share one follower per file through the log hub
+def stream_log_file(log_file: str, line_filter=None) -> StreamingResponse:
+    async def generate():
+        try:
+            async with log_hub.subscribe(log_file, line_filter) as subscription:
+                async for line in subscription:
+                    yield f"data: {line}\n\n"
+        except Exception as e:
+            yield f"data: Error reading log: {str(e)}\n\n"
+
+    return StreamingResponse(generate(), media_type="text/plain")
+
+
+@app.get("/api/logs/followers")
+async def view_log_followers(current_user=Depends(current_active_user)):
+    return log_hub.stats()
+
+
 # 8. View Error Logs
 @app.get("/api/logs/engine")
 async def view_engine_logs(
@@ -507,26 +1034,7 @@ async def view_engine_logs(
             source_path = config["source"]
             log_file = f"{source_path}/server/logs/engine.log"
 
-            async def generate():
-                try:
-                    process = await asyncio.create_subprocess_exec(
-                        "tail",
-                        "-f",
-                        log_file,
-                        stdout=asyncio.subprocess.PIPE,
-                        stderr=asyncio.subprocess.PIPE,
-                    )
-
-                    while True:
-                        line = await process.stdout.readline()
-                        if line:
-                            yield f"data: {line.decode()}\n\n"
-                        else:
-                            break
-                except Exception as e:
-                    yield f"data: Error reading log: {str(e)}\n\n"
-
-            return StreamingResponse(generate(), media_type="text/plain")
+            return stream_log_file(log_file)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
@@ -534,7 +1042,10 @@ async def view_engine_logs(
 # 9. Clear Cache
 @app.get("/api/deployment/clear-cache")
 async def clear_cache(
-    target_id: UUID, execute: bool = False, current_user=Depends(current_active_user)
+    target_id: UUID,
+    execute: bool = False,
+    wait: bool = True,
+    current_user=Depends(current_active_user),
 ):
     logging.info("Clear cached files")
     try:
@@ -543,13 +1054,22 @@ async def clear_cache(
             source_path = config["source"]
 
             command = f"rm -rf {source_path}/server/application/spaces/caches/*"
-            result = await execute_command(command, execute)
+            result = await run_exclusive(
+                target_id,
+                "clear-cache",
+                {"command": command, "execute": execute},
+                lambda: execute_command(command, execute),
+                wait,
+                user=current_user,
+            )
 
             if result["success"]:
                 return {"message": "Cache cleared successfully"}
             else:
                 raise HTTPException(status_code=500, detail="Failed to clear cache")
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
@@ -566,22 +1086,7 @@ async def view_nohup_logs(
             source_path = config["source"]
             log_file = f"{source_path}/server/nohup.out"
 
-            async def generate():
-                try:
-                    process = await asyncio.create_subprocess_exec(
-                        "tail", "-f", log_file, stdout=asyncio.subprocess.PIPE
-                    )
-
-                    while True:
-                        line = await process.stdout.readline()
-                        if line:
-                            yield f"data: {line.decode()}\n\n"
-                        else:
-                            break
-                except Exception as e:
-                    yield f"data: Error reading log: {str(e)}\n\n"
-
-            return StreamingResponse(generate(), media_type="text/plain")
+            return stream_log_file(log_file)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
@@ -599,22 +1104,7 @@ async def view_co_engine_logs(
             source_path = config["source"]
             log_file = f"{source_path}/server/output.log"
 
-            async def generate():
-                try:
-                    process = await asyncio.create_subprocess_exec(
-                        "tail", "-f", log_file, stdout=asyncio.subprocess.PIPE
-                    )
-
-                    while True:
-                        line = await process.stdout.readline()
-                        if line:
-                            yield f"data: {line.decode()}\n\n"
-                        else:
-                            break
-                except Exception as e:
-                    yield f"data: Error reading log: {str(e)}\n\n"
-
-            return StreamingResponse(generate(), media_type="text/plain")
+            return stream_log_file(log_file)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
@@ -623,7 +1113,11 @@ async def view_co_engine_logs(
 # 12. Pull Veolia Plugin
 @app.get("/api/deployment/pull-veolia-plugin")
 async def pull_veolia_plugin(
-    target_id: UUID, execute: bool = False, current_user=Depends(current_active_user)
+    target_id: UUID,
+    execute: bool = False,
+    wait: bool = True,
+    force: bool = False,
+    current_user=Depends(current_active_user),
 ):
     logging.info("Deploy the latest Veolia Plugin commit")
     try:
@@ -642,17 +1136,38 @@ async def pull_veolia_plugin(
                 f"cd {source_path}",
             ]
 
-            command = " && ".join(commands)
-            result = await execute_command(command, execute)
+            result = await run_exclusive(
+                target_id,
+                "pull-veolia-plugin",
+                {"commands": commands, "execute": execute, "force": force},
+                lambda: deploy_if_changed(
+                    target_id,
+                    "plugin",
+                    f"{source_path}/source_code/veoliaplugin",
+                    "origin/build",
+                    lambda: run_pipeline(commands, execute),
+                    execute=execute,
+                    force=force,
+                ),
+                wait,
+                user=current_user,
+            )
 
             if result["success"]:
-                return {"message": "Veolia plugin updated successfully"}
+                if result["skipped"]:
+                    return {"message": result["message"], "skipped": True}
+                return {
+                    "message": "Veolia plugin updated successfully",
+                    "details": {"steps": result["steps"]},
+                }
             else:
                 raise HTTPException(
                     status_code=500,
                     detail=f"Failed to update Veolia plugin: {result.get('stderr', result.get('error'))}",
                 )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
@@ -660,7 +1175,10 @@ async def pull_veolia_plugin(
 # 13. Kill All Engine
 @app.get("/api/deployment/kill-engines")
 async def kill_all_engines(
-    target_id: UUID, execute: bool = False, current_user=Depends(current_active_user)
+    target_id: UUID,
+    execute: bool = False,
+    wait: bool = True,
+    current_user=Depends(current_active_user),
 ):
     logging.info("Kill all running engines")
     try:
@@ -668,27 +1186,43 @@ async def kill_all_engines(
             config = await get_deployment_config(target_id, db)
             source_path = config["source"]
 
-            kill_astack_cmd = f"pwdx $(pidof java) 2>/dev/null | grep '{source_path}/server' | cut -d: -f1 | xargs -r kill"
-            kill_astack_result = await execute_command(kill_astack_cmd, execute)
-
-            # Kill co_engine process
-            kill_coengine_cmd = f"ps aux | grep '[p]ython.*{source_path}/pyastackcore' | awk '{{print $2}}' | xargs -r kill"
-            kill_coengine_result = await execute_command(kill_coengine_cmd, execute)
-
-            return {
-                "message": "All engines killed",
-                "path": source_path,
-                "success": True,
-                "details": {
-                    "kill_astack_cmd": kill_astack_result,
-                    "kill_coengine_cmd": kill_coengine_result,
-                },
-            }
+            return await run_exclusive(
+                target_id,
+                "kill-engines",
+                {"source_path": source_path, "execute": execute},
+                lambda: kill_engines_task(source_path, execute),
+                wait,
+                user=current_user,
+            )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
+async def kill_engines_task(source_path: str, execute: bool = False):
+    kill_astack_result = await stop_processes(
+        await asyncio.to_thread(process_index.engine_processes, source_path), execute
+    )
+
+    # Kill co_engine process
+    kill_coengine_result = await stop_processes(
+        await asyncio.to_thread(process_index.coengine_processes, source_path), execute
+    )
+    status_cache.invalidate(source_path)
+
+    return {
+        "message": "All engines killed",
+        "path": source_path,
+        "success": True,
+        "details": {
+            "kill_astack": kill_astack_result,
+            "kill_coengine": kill_coengine_result,
+        },
+    }
+
+
 # 14. View Error Logs Only
 @app.get("/api/logs/errors")
 async def view_error_logs_only(
@@ -701,24 +1235,73 @@ async def view_error_logs_only(
             source_path = config["source"]
             log_file = f"{source_path}/server/nohup.out"
 
-            async def generate():
-                try:
-                    process = await asyncio.create_subprocess_shell(
-                        f"tail -f {log_file} | grep --line-buffered 'error'",
-                        stdout=asyncio.subprocess.PIPE,
-                    )
+            return stream_log_file(log_file, lambda line: "error" in line)
 
-                    while True:
-                        line = await process.stdout.readline()
-                        if line:
-                            yield f"data: {line.decode()}\n\n"
-                        else:
-                            break
-                except Exception as e:
-                    yield f"data: Error reading log: {str(e)}\n\n"
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+# 15. Search Logs
+@app.get("/api/logs/search")
+async def search_logs(
+    target_id: UUID,
+    log_type: str = "engine",
+    q: Optional[str] = None,
+    regex: Optional[str] = None,
+    level: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    before: Optional[int] = None,
+    before_offset: Optional[int] = None,
+    limit: int = 100,
+    current_user=Depends(current_active_user),
+):
+    logging.info(f"Search {log_type} logs: q={q} regex={regex} level={level}")
+    if log_type not in LOG_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"log_type must be one of {', '.join(LOG_FILES)}",
+        )
+    if level:
+        try:
+            log_index.level_code(level)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Unknown log level: {level}")
+    if regex:
+        try:
+            re.compile(regex)
+        except re.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid regex: {str(e)}")
 
-            return StreamingResponse(generate(), media_type="text/plain")
+    try:
+        async for db in get_async_session():
+            config = await get_deployment_config(target_id, db)
+            source_path = config["source"]
+            log_file = f"{source_path}/{LOG_FILES[log_type]}"
+
+            if not os.path.exists(log_file):
+                raise HTTPException(status_code=404, detail="Log file not found")
+
+            started = time()
+            # Newest matches first; pass next_before_offset back as `before_offset`
+            # for the next page. Lines not indexed yet are scanned directly and
+            # have no line number, so next_before is only set inside the index.
+            result = await asyncio.to_thread(
+                log_indexes.get(log_file).search,
+                keywords=q,
+                pattern=regex,
+                level=level,
+                since=since.timestamp() if since else None,
+                until=until.timestamp() if until else None,
+                before=before,
+                before_offset=before_offset,
+                limit=max(1, min(limit, 1000)),
+            )
+            result["elapsed_ms"] = round((time() - started) * 1000, 1)
+            return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
@@ -726,7 +1309,10 @@ async def view_error_logs_only(
 # Status endpoint
 @app.get("/api/deployment/status")
 async def get_deployment_status(
-    target_id: UUID, execute: bool = False, current_user=Depends(current_active_user)
+    target_id: UUID,
+    execute: bool = False,
+    refresh: bool = False,
+    current_user=Depends(current_active_user),
 ):
     logging.info("Get current deployment status")
     try:
@@ -734,50 +1320,100 @@ async def get_deployment_status(
             config = await get_deployment_config(target_id, db)
             source_path = config["source"]
 
-            # Check if server is running
-            check_cmd = f"pgrep -f 'java.*{source_path}/server'"
-            result = await execute_command(check_cmd, execute)
-            is_running = result["success"] and result["stdout"].strip()
-
-            # Get current commits
-            be_commit_cmd = f"cd {source_path}/source_code/atprofveolia/ && git rev-parse --short HEAD"
-            ui_commit_cmd = f"cd {source_path}/source_code/atprofveoliaui/ && git rev-parse --short HEAD"
-
-            be_commit_result = await execute_command(be_commit_cmd, execute)
-            ui_commit_result = await execute_command(ui_commit_cmd, execute)
-
-            # Get current environment
-            env_cmd = f"sed -n '5s/.*:[[:space:]]*//p' {source_path}/server/sff.auto.config.cdm | sed 's/ *#.*//'"
-            env_result = await execute_command(env_cmd, execute)
+            if refresh:
+                status_cache.invalidate(source_path)
+            status = await status_cache.get(source_path)
 
             return {
                 "environment": config["env"],
                 "port": config["port"],
-                "server_running": bool(is_running),
-                "server_pid": result["stdout"].strip() if is_running else None,
-                "current_be_commit": (
-                    be_commit_result["stdout"].strip()
-                    if be_commit_result["success"]
-                    else "unknown"
-                ),
-                "current_ui_commit": (
-                    ui_commit_result["stdout"].strip()
-                    if ui_commit_result["success"]
-                    else "unknown"
-                ),
-                "server_environment": (
-                    env_result["stdout"].strip() if env_result["success"] else "unknown"
-                ),
-                "last_updated": datetime.now().isoformat(),
+                **status,
             }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
+# Fleet status: probes every matching target concurrently and streams one
+# NDJSON line per target as soon as its probe finishes
+@app.get("/api/deployment/fleet-status")
+async def get_fleet_status(
+    server_role: Optional[str] = None,
+    server_status: Optional[bool] = None,
+    parallelism: Optional[int] = None,
+    refresh: bool = False,
+    current_user=Depends(current_active_user),
+):
+    logging.info("Get deployment status of all targets")
+    async for db in get_async_session():
+        stmt = select(Target)
+        if server_role:
+            stmt = stmt.where(Target.server_role == server_role)
+        if server_status is not None:
+            stmt = stmt.where(Target.server_status == server_status)
+        result = await db.execute(stmt)
+        targets = result.scalars().all()
+
+    limit = server_config["backend"].get("status", {}).get("fleet_parallelism", 16)
+    if parallelism:
+        limit = max(1, min(parallelism, limit))
+    slots = asyncio.Semaphore(limit)
+
+    async def probe(db_target: Target):
+        started = time()
+        async with slots:
+            try:
+                config = target_configs.get(db_target.id)
+                if config is None:
+                    config = await asyncio.to_thread(target_configs.load, db_target)
+                source_path = config["source"]
+                if refresh:
+                    status_cache.invalidate(source_path)
+                status = await status_cache.get(source_path)
+                entry = {
+                    "success": True,
+                    "environment": config["env"],
+                    "port": config["port"],
+                    **status,
+                }
+            except Exception as e:
+                entry = {"success": False, "error": str(e)}
+        entry.update(
+            {
+                "target_id": str(db_target.id),
+                "server_name": db_target.name,
+                "server_tag": db_target.server_tag,
+                "server_role": db_target.server_role,
+                "elapsed": round(time() - started, 3),
+            }
+        )
+        return entry
+
+    async def generate():
+        started = time()
+        tasks = [asyncio.create_task(probe(db_target)) for db_target in targets]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+            yield json.dumps(
+                {
+                    "done": True,
+                    "targets": len(tasks),
+                    "elapsed": round(time() - started, 3),
+                }
+            ) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
 @app.get("/targets/{target_id}/logs")
-async def get_target_logs(target_id: UUID, lines: int = 10):
-    logging.info("Tail the logs with the last {lines} lines")
+async def get_target_logs(
+    target_id: UUID, lines: int = 10, cursor: Optional[int] = None
+):
+    logging.info(f"Tail the logs with the last {lines} lines")
 
     try:
         async for db in get_async_session():
@@ -791,10 +1427,14 @@ async def get_target_logs(target_id: UUID, lines: int = 10):
 
         if not os.path.exists(log_path):
             return JSONResponse(content={"logs": ["Log file not found."]})
-        with open(log_path, "r") as f:
-            all_lines = f.readlines()
-            recent_lines = all_lines[-lines:]
-        return JSONResponse(content={"logs": recent_lines})
+        # Pass the returned cursor back to get only the lines appended since
+        if cursor is None:
+            result = await asyncio.to_thread(log_tail.tail_lines, log_path, lines)
+        else:
+            result = await asyncio.to_thread(
+                log_tail.read_since, log_path, cursor, lines
+            )
+        return JSONResponse(content=result)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
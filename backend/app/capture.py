@@ -0,0 +1,146 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from typing import Optional
+
+config_path = os.path.join(os.path.dirname(__file__), "../../config.json")
+with open(config_path) as config_file:
+    config = json.load(config_file)
+
+capture_config = config["backend"].get("capture", {})
+OUTPUT_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", capture_config.get("dir", "output"))
+)
+HEAD_BYTES = capture_config.get("head_bytes", 16384)
+TAIL_BYTES = capture_config.get("tail_bytes", 16384)
+RETENTION_DAYS = capture_config.get("retention_days", 7)
+PRUNE_INTERVAL = capture_config.get("prune_interval", 3600)
+# Spilled output is compressed and written in a thread once this much is pending
+FLUSH_BYTES = capture_config.get("flush_bytes", 262144)
+
+OUTPUT_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+STREAMS = ("stdout", "stderr")
+
+
+def new_output_id() -> str:
+    return uuid.uuid4().hex
+
+
+def output_path(output_id: str, stream: str) -> Optional[str]:
+    if not OUTPUT_ID_RE.match(output_id) or stream not in STREAMS:
+        return None
+    return os.path.join(OUTPUT_DIR, f"{output_id}-{stream}.log.gz")
+
+
+# Captures one output stream with bounded memory: output that fits in
+# head + tail bytes stays in memory; anything longer keeps only its first and
+# last bytes in memory and is written in full to a gzip file. Compression and
+# file writes happen in a worker thread, one flush at a time so chunks stay in
+# order, and the caller waits for each flush before feeding more.
+class OutputCapture:
+    def __init__(
+        self,
+        output_id: str,
+        stream: str,
+        head_bytes: int = HEAD_BYTES,
+        tail_bytes: int = TAIL_BYTES,
+    ):
+        self.output_id = output_id
+        self.stream = stream
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.total = 0
+        self.path: Optional[str] = None
+        self._buffer = bytearray()
+        self._head = b""
+        self._pending = bytearray()
+        self._file = None
+        self._closed = False
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+    async def feed(self, chunk: bytes):
+        self.total += len(chunk)
+        if not self.spilled:
+            self._buffer += chunk
+            if len(self._buffer) <= self.head_bytes + self.tail_bytes:
+                return
+            self.path = output_path(self.output_id, self.stream)
+            self._pending += self._buffer
+            self._head = bytes(self._buffer[: self.head_bytes])
+            del self._buffer[: len(self._buffer) - self.tail_bytes]
+        else:
+            self._pending += chunk
+            self._buffer += chunk
+            if len(self._buffer) > 2 * self.tail_bytes:
+                del self._buffer[: len(self._buffer) - self.tail_bytes]
+        if len(self._pending) >= FLUSH_BYTES:
+            await self._flush()
+
+    async def _flush(self):
+        data = bytes(self._pending)
+        self._pending.clear()
+        await asyncio.to_thread(self._write, data)
+
+    def _write(self, data: bytes):
+        if self._file is None:
+            os.makedirs(OUTPUT_DIR, exist_ok=True)
+            # Level 1: output is mostly text and this runs while the command does
+            self._file = gzip.open(self.path, "wb", compresslevel=1)
+        self._file.write(data)
+
+    async def close(self):
+        if not self.spilled or self._closed:
+            return
+        self._closed = True
+        if self._pending or self._file is None:
+            await self._flush()
+        await asyncio.to_thread(self._file.close)
+        self._file = None
+
+    def preview(self) -> str:
+        if not self.spilled:
+            return self._buffer.decode(errors="replace")
+        tail = bytes(self._buffer[-self.tail_bytes :])
+        skipped = self.total - len(self._head) - len(tail)
+        return (
+            self._head.decode(errors="replace")
+            + f"\n... [{skipped} bytes truncated, full output: {self.stream} of {self.output_id}] ...\n"
+            + tail.decode(errors="replace")
+        )
+
+
+def prune(max_age_days: float = RETENTION_DAYS) -> int:
+    if not os.path.isdir(OUTPUT_DIR):
+        return 0
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for entry in os.scandir(OUTPUT_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    if removed:
+        logging.info(
+            f"[Capture] Removed {removed} output files older than {max_age_days} days"
+        )
+    return removed
+
+
+# Keeps a long-running server within the retention window, not only at startup
+async def prune_periodically(interval: float = PRUNE_INTERVAL):
+    while True:
+        try:
+            await asyncio.to_thread(prune)
+        except Exception as e:
+            logging.info(f"[Capture] Pruning output files failed: {str(e)}")
+        await asyncio.sleep(interval)
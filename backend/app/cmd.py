@@ -1,11 +1,25 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List
-import subprocess
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from time import time
+from contextlib import aclosing
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import asyncio
+import codecs
 import paramiko
+import select as select_mod
+import signal
+import threading
 import os
 import json
 
+from app.db import Target, get_async_session
+from app.ssh_pool import SSHConnectionPool
+from app.metrics import track_subprocess
+
 from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin, models
 from fastapi_users.authentication import (
     AuthenticationBackend,
@@ -20,12 +34,39 @@ with open(config_path) as config_file:
     config = json.load(config_file)
 
 SECRET = config["backend"]["secret_key"]
+ssh_config = config["backend"].get("ssh", {})
+command_config = config["backend"].get("command", {})
+
+# Caps how many commands run at once across all requests, so one heavy request
+# cannot starve the event loop or the SSH pool for everyone else
+command_slots = asyncio.Semaphore(command_config.get("max_concurrent", 8))
+# Blocking paramiko calls run here instead of on the event loop
+ssh_executor = ThreadPoolExecutor(
+    max_workers=command_config.get("executor_workers", 16),
+    thread_name_prefix="ssh-exec",
+)
+# Streaming mode reads output in chunks of this size and keeps at most
+# stream_queue_size chunks in flight per command, whatever the command prints
+stream_chunk_size = command_config.get("stream_chunk_size", 4096)
+stream_queue_size = command_config.get("stream_queue_size", 64)
 
 
 class CMDString(BaseModel):
-    server: str
+    server: Optional[str] = None
     mode: str
     commands: List[str]  # Change to a list of commands
+    # Fan-out: run on several servers at once, either listed explicitly or
+    # selected from the Target table by role/alias
+    servers: Optional[List[str]] = None
+    server_role: Optional[str] = None
+    server_alias: Optional[str] = None
+    parallelism: Optional[int] = None
+    # Stream NDJSON events (stdout/stderr chunks, exit codes) as they happen
+    stream: bool = False
+
+
+class SSHSessionError(Exception):
+    pass
 
 
 class SSHClient:
@@ -79,26 +120,332 @@ class SSHClient:
             )
             return False
 
+    def is_active(self):
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def set_keepalive(self, interval):
+        transport = self.client.get_transport()
+        if transport is not None and interval:
+            transport.set_keepalive(interval)
+
     def execute(self, command):
-        stdin, stdout, stderr = self.client.exec_command(command)
+        try:
+            stdin, stdout, stderr = self.client.exec_command(command)
+        except (paramiko.SSHException, EOFError, OSError) as e:
+            # The channel never opened, so the command did not run
+            raise SSHSessionError(f"Could not open SSH session on {self.hostname}: {str(e)}")
         return {
             "output": stdout.read().decode("utf-8"),
             "error": stderr.read().decode("utf-8"),
             "exit_code": stdout.channel.recv_exit_status(),
         }
 
+    def stream(self, command, emit, chunk_size=4096):
+        try:
+            channel = self.client.get_transport().open_session()
+            channel.exec_command(command)
+        except (paramiko.SSHException, EOFError, OSError, AttributeError) as e:
+            raise SSHSessionError(
+                f"Could not open SSH session on {self.hostname}: {str(e)}"
+            )
+
+        try:
+            while True:
+                if channel.recv_ready():
+                    if not emit("stdout", channel.recv(chunk_size)):
+                        return None
+                elif channel.recv_stderr_ready():
+                    if not emit("stderr", channel.recv_stderr(chunk_size)):
+                        return None
+                elif channel.exit_status_ready():
+                    return channel.recv_exit_status()
+                else:
+                    select_mod.select([channel], [], [], 1.0)
+        finally:
+            channel.close()
+
     def close(self):
         self.client.close()
 
 
+ssh_pool = SSHConnectionPool(
+    SSHClient,
+    max_sessions_per_host=ssh_config.get("max_sessions_per_host", 4),
+    idle_timeout=ssh_config.get("idle_timeout", 300),
+    keepalive_interval=ssh_config.get("keepalive_interval", 30),
+    acquire_timeout=ssh_config.get("acquire_timeout", 60),
+)
+
+
+def execute_remote(server: str, command: str, emit=None):
+    # Retry once on a fresh transport if the pooled one turned out to be dead
+    for attempt in range(2):
+        with ssh_pool.session(server) as ssh:
+            try:
+                if emit is not None:
+                    return ssh.stream(command, emit, stream_chunk_size)
+                return ssh.execute(command)
+            except SSHSessionError as e:
+                print(f"SSH session error: {str(e)}")
+                ssh_pool.invalidate(server, ssh)
+                if attempt:
+                    raise
+
+
+async def run_remote(server: str, command: str):
+    async with command_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(ssh_executor, execute_remote, server, command)
+
+
+async def run_local(command: str):
+    async with command_slots:
+        with track_subprocess():
+            process = await asyncio.create_subprocess_shell(
+                command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            stdout, stderr = await process.communicate()
+        return {
+            "output": stdout.decode("utf-8", errors="replace"),
+            "error": stderr.decode("utf-8", errors="replace"),
+            "exit_code": process.returncode,
+        }
+
+
+async def stream_local(command: str, queue: asyncio.Queue):
+    with track_subprocess():
+        return await _stream_local(command, queue)
+
+
+async def _stream_local(command: str, queue: asyncio.Queue):
+    # Own process group so a disconnecting client takes pipelines down with it
+    process = await asyncio.create_subprocess_shell(
+        command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+
+    async def pump(reader, kind):
+        while True:
+            chunk = await reader.read(stream_chunk_size)
+            if not chunk:
+                break
+            await queue.put((kind, chunk))
+
+    try:
+        await asyncio.gather(
+            pump(process.stdout, "stdout"), pump(process.stderr, "stderr")
+        )
+        return await process.wait()
+    finally:
+        if process.returncode is None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            # Drain what is left in the pipes so the transport sees EOF
+            await process.communicate()
+
+
+async def stream_remote(server: str, command: str, queue: asyncio.Queue):
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+
+    # Runs in the executor thread; blocks while the queue is full so a slow
+    # client applies backpressure to the channel instead of growing memory
+    def emit(kind, chunk):
+        future = asyncio.run_coroutine_threadsafe(queue.put((kind, chunk)), loop)
+        while True:
+            try:
+                future.result(timeout=1)
+                return True
+            except FutureTimeoutError:
+                if cancelled.is_set():
+                    future.cancel()
+                    return False
+
+    try:
+        return await loop.run_in_executor(
+            ssh_executor, execute_remote, server, command, emit
+        )
+    finally:
+        cancelled.set()
+
+
+async def stream_command(server: str, mode: str, command: str):
+    queue = asyncio.Queue(maxsize=stream_queue_size)
+
+    async def produce():
+        try:
+            async with command_slots:
+                if mode == "remote":
+                    exit_code = await stream_remote(server, command, queue)
+                else:
+                    exit_code = await stream_local(command, queue)
+            await queue.put(("exit", exit_code))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(("exception", e))
+
+    producer = asyncio.create_task(produce())
+    decoders = {
+        "stdout": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+        "stderr": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+    }
+    try:
+        while True:
+            kind, data = await queue.get()
+            if kind in decoders:
+                text = decoders[kind].decode(data)
+                if text:
+                    yield kind, text
+            else:
+                for name, decoder in decoders.items():
+                    text = decoder.decode(b"", final=True)
+                    if text:
+                        yield name, text
+                yield kind, data
+                return
+    finally:
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
+
+
+async def stream_commands(server: str, mode: str, commands: List[str]):
+    def event(**fields):
+        return json.dumps(fields) + "\n"
+
+    request_mode = mode if mode else "local"
+    print(f"Streaming commands {commands} on server '{server}' ({request_mode})")
+    for index, command in enumerate(commands):
+        yield event(type="start", index=index, command=command, server=server)
+        started = time()
+        async with aclosing(stream_command(server, request_mode, command)) as events:
+            async for kind, data in events:
+                if kind == "exception":
+                    print(f"Exception: {str(data)}")
+                    yield event(
+                        type="error",
+                        index=index,
+                        message=f"Command execution failed: {str(data)}",
+                    )
+                    yield event(type="done", status="error", server=server)
+                    return
+                if kind == "exit":
+                    yield event(
+                        type="exit",
+                        index=index,
+                        exit_code=data,
+                        elapsed=round(time() - started, 3),
+                    )
+                    if data != 0:
+                        print(f"Command exited with status code {data}")
+                        yield event(
+                            type="done",
+                            status="error",
+                            exit_code=data,
+                            command=command,
+                            server=server,
+                        )
+                        return
+                else:
+                    yield event(type=kind, index=index, data=data)
+
+    yield event(type="done", status="success", server=server)
+
+
+@router.get("/command/pool")
+async def ssh_pool_stats():
+    return ssh_pool.stats()
+
+
 @router.post("/command")
-async def cmd(request: CMDString):
+async def cmd(request: CMDString, db: AsyncSession = Depends(get_async_session)):
+    if request.servers or request.server_role or request.server_alias:
+        if request.stream:
+            raise HTTPException(
+                status_code=400,
+                detail="Streaming is only supported for a single server",
+            )
+        servers = await resolve_servers(request, db)
+        if not servers:
+            raise HTTPException(status_code=404, detail="No servers matched the request")
+        return await execute_fanout(
+            servers, request.mode, request.commands, request.parallelism
+        )
+
+    if request.stream:
+        if not request.server or not request.commands:
+            raise HTTPException(status_code=400, detail="Invalid server or commands")
+        return StreamingResponse(
+            stream_commands(request.server, request.mode, request.commands),
+            media_type="application/x-ndjson",
+        )
+
     response = await execute_command(request.server, request.mode, request.commands)
     if response["status"] == "error":
         raise HTTPException(status_code=500, detail=response["message"])
     return response
 
 
+async def resolve_servers(request: CMDString, db: AsyncSession) -> List[str]:
+    servers = list(request.servers or [])
+    if request.server_role or request.server_alias:
+        stmt = select(Target.server_alias).where(Target.server_status.is_(True))
+        if request.server_role:
+            stmt = stmt.where(Target.server_role == request.server_role)
+        if request.server_alias:
+            stmt = stmt.where(Target.server_alias == request.server_alias)
+        result = await db.execute(stmt)
+        servers.extend(result.scalars().all())
+    # Several targets usually share one host alias; run once per host
+    return list(dict.fromkeys(server for server in servers if server))
+
+
+async def execute_fanout(
+    servers: List[str], mode: str, commands: List[str], parallelism: Optional[int] = None
+):
+    limit = command_config.get("fanout_parallelism", 8)
+    if parallelism:
+        limit = max(1, min(parallelism, limit))
+    slots = asyncio.Semaphore(limit)
+
+    async def run_on(server: str):
+        async with slots:
+            started = time()
+            response = await execute_command(server, mode, commands)
+            response["elapsed"] = round(time() - started, 3)
+            return server, response
+
+    started = time()
+    responses = dict(await asyncio.gather(*(run_on(server) for server in servers)))
+    failed = [server for server, response in responses.items() if response["status"] != "success"]
+    if not failed:
+        status = "success"
+    elif len(failed) == len(servers):
+        status = "error"
+    else:
+        status = "partial"
+
+    return {
+        "status": status,
+        "servers": servers,
+        "failed": failed,
+        "parallelism": limit,
+        "elapsed": round(time() - started, 3),
+        "results": responses,
+    }
+
+
 async def execute_command(server: str, mode: str, commands: List[str]):
     print(f"Commands '{commands}' executed on server '{server}'")
     if server and commands:
@@ -108,23 +455,22 @@ async def execute_command(server: str, mode: str, commands: List[str]):
 
         try:
             if request_mode == "remote":
-                ssh = SSHClient(server)
-                if not ssh.connect():
-                    return {
-                        "status": "error",
-                        "message": "Failed to establish SSH connection",
-                        "commands": commands,
-                        "server": server,
-                    }
-
                 results = []
                 for command in commands:
-                    result = ssh.execute(command)
+                    try:
+                        result = await run_remote(server, command)
+                    except (ConnectionError, TimeoutError) as e:
+                        print(f"SSH connection error for {server}: {str(e)}")
+                        return {
+                            "status": "error",
+                            "message": "Failed to establish SSH connection",
+                            "commands": commands,
+                            "server": server,
+                        }
                     results.append(result)
                     if result["exit_code"] != 0:
                         print(f"Command exited with status code {result['exit_code']}")
                         print(f"Error: {result['error']}")
-                        ssh.close()
                         return {
                             "status": "error",
                             "exit_code": result["exit_code"],
@@ -133,7 +479,6 @@ async def execute_command(server: str, mode: str, commands: List[str]):
                             "server": server,
                         }
 
-                ssh.close()
                 return {
                     "status": "success",
                     "results": results,
@@ -143,28 +488,15 @@ async def execute_command(server: str, mode: str, commands: List[str]):
             else:
                 results = []
                 for command in commands:
-                    result = subprocess.run(
-                        command,
-                        shell=True,
-                        check=False,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        text=True,
-                    )
-                    results.append(
-                        {
-                            "output": result.stdout,
-                            "error": result.stderr,
-                            "exit_code": result.returncode,
-                        }
-                    )
-                    if result.returncode != 0:
-                        print(f"Command exited with status code {result.returncode}")
-                        print(f"Error: {result.stderr}")
+                    result = await run_local(command)
+                    results.append(result)
+                    if result["exit_code"] != 0:
+                        print(f"Command exited with status code {result['exit_code']}")
+                        print(f"Error: {result['error']}")
                         return {
                             "status": "error",
-                            "exit_code": result.returncode,
-                            "message": result.stderr,
+                            "exit_code": result["exit_code"],
+                            "message": result["error"],
                             "command": command,
                             "server": server,
                         }
@@ -6,7 +6,9 @@ from fastapi import Depends
 from fastapi_users.db import SQLAlchemyBaseUserTableUUID, SQLAlchemyUserDatabase
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import Column, String, Boolean, UUID, ForeignKey
+from sqlalchemy import Column, String, Boolean, UUID, ForeignKey, DateTime, JSON, Float, Index, event, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import URL, make_url
 import uuid
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -15,12 +17,116 @@ config_path = os.path.abspath(os.path.join(current_dir, "../../config.json"))
 with open(config_path) as config_file:
     config = json.load(config_file)
 
-db_name = config["backend"]["db"]["name"]
+db_config = config["backend"]["db"]
+db_name = db_config["name"]
 db_path = os.path.abspath(os.path.join(current_dir, f"../db/{db_name}.db"))
-print("Resolved DB path:", db_path)
 
-DATABASE_URL = f"sqlite+aiosqlite:///{db_path}"
-    
+# "sqlite" (default) or "postgres"; DB_ENGINE overrides the config, and a full
+# DATABASE_URL overrides both
+DB_ENGINE = os.environ.get("DB_ENGINE", db_config.get("engine", "sqlite"))
+
+# Pool settings for PostgreSQL; every worker process gets its own pool
+POSTGRES_PROFILE = {
+    "host": "localhost",
+    "port": 5432,
+    "name": "cmdserver",
+    "user": "cmdserver",
+    "password": "",
+    "pool_size": 10,
+    "max_overflow": 10,
+    "pool_timeout": 30,
+    "pool_recycle": 1800,
+    "pool_pre_ping": True,
+    "statement_cache_size": 500,  # prepared statements kept per connection
+    **db_config.get("postgres", {}),
+}
+for key, env in (
+    ("host", "POSTGRES_HOST"),
+    ("port", "POSTGRES_PORT"),
+    ("name", "POSTGRES_DB"),
+    ("user", "POSTGRES_USER"),
+    ("password", "POSTGRES_PASSWORD"),
+):
+    if os.environ.get(env):
+        POSTGRES_PROFILE[key] = os.environ[env]
+
+
+def database_url() -> str:
+    if os.environ.get("DATABASE_URL"):
+        return os.environ["DATABASE_URL"]
+    if DB_ENGINE in ("postgres", "postgresql"):
+        return URL.create(
+            "postgresql+asyncpg",
+            username=POSTGRES_PROFILE["user"],
+            password=POSTGRES_PROFILE["password"] or None,
+            host=POSTGRES_PROFILE["host"],
+            port=int(POSTGRES_PROFILE["port"]),
+            database=POSTGRES_PROFILE["name"],
+        ).render_as_string(hide_password=False)
+    print("Resolved DB path:", db_path)
+    return f"sqlite+aiosqlite:///{db_path}"
+
+
+DATABASE_URL = database_url()
+
+# Applied to every new SQLite connection; WAL lets readers carry on while a
+# writer commits, and busy_timeout makes writers queue instead of failing
+# with "database is locked"
+SQLITE_PROFILE = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -32000,  # negative: KiB, so ~32 MB per connection
+    "mmap_size": 268435456,
+    "busy_timeout": 5000,  # ms
+    "temp_store": "MEMORY",
+    **config["backend"]["db"].get("sqlite", {}),
+}
+
+
+def apply_sqlite_profile(engine, profile=SQLITE_PROFILE):
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in profile.items():
+            if value is not None:
+                cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+
+def normalize_url(url) -> URL:
+    # Hosting providers hand out postgres:// URLs, and a postgresql:// URL
+    # defaults to a sync driver; every PostgreSQL URL runs on asyncpg here
+    url = make_url(url)
+    if url.drivername.split("+", 1)[0] in ("postgres", "postgresql"):
+        url = url.set(drivername="postgresql+asyncpg")
+    return url
+
+
+def make_postgres_engine(url, profile=POSTGRES_PROFILE):
+    url = normalize_url(url).update_query_dict(
+        {"prepared_statement_cache_size": str(profile["statement_cache_size"])}
+    )
+    return create_async_engine(
+        url,
+        pool_size=profile["pool_size"],
+        max_overflow=profile["max_overflow"],
+        pool_timeout=profile["pool_timeout"],
+        pool_recycle=profile["pool_recycle"],
+        pool_pre_ping=profile["pool_pre_ping"],
+    )
+
+
+def make_engine(url=DATABASE_URL, profile=SQLITE_PROFILE):
+    if normalize_url(url).get_backend_name() == "postgresql":
+        return make_postgres_engine(url)
+    connect_args = {}
+    if profile.get("busy_timeout") is not None:
+        connect_args["timeout"] = profile["busy_timeout"] / 1000
+    engine = create_async_engine(url, connect_args=connect_args)
+    apply_sqlite_profile(engine, profile)
+    return engine
+
+
 class Base(DeclarativeBase):
     pass
 
@@ -38,20 +144,110 @@ class Target(Base):
     name = Column(String, nullable=False, default="QA")
     description = Column(String, nullable=True)
     server_tag = Column(String, nullable=False, default="QA.APP", unique=True)
-    server_alias = Column(String, nullable=False, default="veodev")
+    server_alias = Column(String, nullable=False, default="veodev", index=True)
     server_path = Column(String, nullable=False, default="/data2/Atomiton/WaterTRN/QA")
     server_port = Column(String, nullable=False, default="8686")
-    server_role = Column(String, nullable=False, default="APP")
-    server_status = Column(Boolean, default=True)
+    server_role = Column(String, nullable=False, default="APP", index=True)
+    server_status = Column(Boolean, default=True, index=True)
+
+
+class Job(Base):
+    __tablename__ = "job"
 
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String, nullable=False)  # e.g. "restart", "pull-be", "reschema"
+    target_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, succeeded, failed
+    params = Column(JSON, nullable=False, default=dict)
+    steps = Column(JSON, nullable=False, default=list)
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    created_by = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    owner = Column(String, nullable=True)  # "host:pid:nonce" of the worker running it
+    heartbeat_at = Column(DateTime, nullable=True)
+
+
+class AuthToken(Base):
+    __tablename__ = "auth_token"
+
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    token = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class DeployedCommit(Base):
+    __tablename__ = "deployed_commit"
+
+    target_id = Column(UUID(as_uuid=True), primary_key=True)
+    component = Column(String, primary_key=True)  # "backend", "ui" or "plugin"
+    commit = Column(String, nullable=False)
+    deployed_at = Column(DateTime, nullable=False)
+    timings = Column(JSON, nullable=True)  # per-step breakdown of that deploy
+
+
+class DeploymentRun(Base):
+    __tablename__ = "deployment_run"
+    __table_args__ = (Index("ix_deployment_run_started", "started_at", "id"),)
 
-engine = create_async_engine(DATABASE_URL)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    target_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    operation = Column(String, nullable=False)  # e.g. "pull-be", "restart", "clear-cache"
+    status = Column(String, nullable=False)  # succeeded, failed or skipped
+    user = Column(String, nullable=True)
+    commit = Column(String, nullable=True)
+    job_id = Column(UUID(as_uuid=True), nullable=True)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    elapsed = Column(Float, nullable=True)
+    error = Column(String, nullable=True)
+    steps = Column(JSON, nullable=False, default=list)  # output lives in the artifact
+    artifact = Column(Boolean, nullable=False, default=False)
+
+
+engine = make_engine()
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
 
+# INSERT supporting on_conflict_do_update/do_nothing for the engine in use
+def upsert(model):
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def add_missing_columns(connection):
+    # create_all skips tables that already exist; nullable columns added to a
+    # model later are appended to the existing table
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(
+                text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+            )
+
+
+def create_missing_indexes(connection):
+    # create_all skips tables that already exist, so indexes added to a model
+    # later would never reach an existing database
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
 async def create_db_and_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(add_missing_columns)
+        await conn.run_sync(create_missing_indexes)
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
@@ -0,0 +1,49 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import select
+
+from app import db
+from app.db import DeployedCommit
+
+
+def _uuid(target_id) -> UUID:
+    return target_id if isinstance(target_id, UUID) else UUID(str(target_id))
+
+
+# The commit each component of a target was last deployed from
+async def deployed_commit(target_id, component: str) -> Optional[str]:
+    async with db.async_session_maker() as session:
+        row = await session.get(DeployedCommit, (_uuid(target_id), component))
+        return row.commit if row else None
+
+
+async def record_deployed_commit(
+    target_id, component: str, commit: str, timings: Optional[List[Dict]] = None
+):
+    async with db.async_session_maker() as session:
+        await session.merge(
+            DeployedCommit(
+                target_id=_uuid(target_id),
+                component=component,
+                commit=commit,
+                deployed_at=datetime.now(),
+                timings=timings,
+            )
+        )
+        await session.commit()
+
+
+async def deployed_commits(target_id) -> Dict[str, Dict[str, Any]]:
+    stmt = select(DeployedCommit).where(DeployedCommit.target_id == _uuid(target_id))
+    async with db.async_session_maker() as session:
+        result = await session.execute(stmt)
+        return {
+            row.component: {
+                "commit": row.commit,
+                "deployed_at": row.deployed_at.isoformat(),
+                "timings": row.timings,
+            }
+            for row in result.scalars()
+        }
@@ -0,0 +1,292 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from time import monotonic
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse
+from sqlalchemy import and_, delete, or_, select
+
+from app import capture
+from app import db
+from app.db import DeploymentRun
+
+config_path = os.path.join(os.path.dirname(__file__), "../../config.json")
+with open(config_path) as config_file:
+    config = json.load(config_file)
+
+history_config = config["backend"].get("history", {})
+ARTIFACT_DIR = os.path.join(capture.OUTPUT_DIR, "runs")
+
+
+def artifact_path(run_id) -> str:
+    return os.path.join(ARTIFACT_DIR, f"{UUID(str(run_id)).hex}.json.gz")
+
+
+def _user_label(user) -> Optional[str]:
+    if user is None or isinstance(user, str):
+        return user
+    return getattr(user, "email", None)
+
+
+def run_to_dict(run: DeploymentRun) -> Dict[str, Any]:
+    return {
+        "id": str(run.id),
+        "target_id": str(run.target_id) if run.target_id else None,
+        "operation": run.operation,
+        "status": run.status,
+        "user": run.user,
+        "commit": run.commit,
+        "job_id": str(run.job_id) if run.job_id else None,
+        "started_at": run.started_at.isoformat(),
+        "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+        "elapsed": run.elapsed,
+        "error": run.error,
+        "steps": run.steps,
+    }
+
+
+# Persists run records off the request path: callers enqueue and return, and a
+# single writer stores whatever has queued up as one transaction, with the full
+# result written next to it as a gzip artifact
+class RunRecorder:
+    def __init__(self, batch_size: int = 50, retention_days: float = 90):
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.failed = 0
+
+    async def start(self):
+        await self.prune()
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._writer())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # Let the writer finish whatever is queued before it exits
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    def submit(self, run: Dict[str, Any], result: Any = None):
+        if self._queue is None:
+            logging.info(f"[History] Recorder not running, dropping run {run['id']}")
+            return
+        self._queue.put_nowait((run, result))
+
+    async def _writer(self):
+        stopping = False
+        while not stopping:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if None in batch:
+                stopping = True
+                batch = [item for item in batch if item is not None]
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch: List[tuple]):
+        try:
+            await asyncio.to_thread(self._write_artifacts, batch)
+            async with db.async_session_maker() as session:
+                session.add_all(DeploymentRun(**run) for run, _ in batch)
+                await session.commit()
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logging.info(f"[History] Failed to record {len(batch)} runs: {str(e)}")
+
+    @staticmethod
+    def _write_artifacts(batch: List[tuple]):
+        os.makedirs(ARTIFACT_DIR, exist_ok=True)
+        for run, result in batch:
+            if result is None:
+                continue
+            with gzip.open(artifact_path(run["id"]), "wt", compresslevel=6) as f:
+                json.dump(jsonable_encoder(result), f)
+            run["artifact"] = True
+
+    async def prune(self):
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        async with db.async_session_maker() as session:
+            result = await session.execute(
+                select(DeploymentRun.id).where(DeploymentRun.started_at < cutoff)
+            )
+            expired = [row[0] for row in result.all()]
+            if not expired:
+                return
+            await session.execute(
+                delete(DeploymentRun).where(DeploymentRun.started_at < cutoff)
+            )
+            await session.commit()
+        for run_id in expired:
+            try:
+                os.remove(artifact_path(run_id))
+            except OSError:
+                pass
+        logging.info(f"[History] Pruned {len(expired)} runs")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "written": self.written,
+            "failed": self.failed,
+        }
+
+
+run_recorder = RunRecorder(
+    batch_size=history_config.get("batch_size", 50),
+    retention_days=history_config.get("retention_days", 90),
+)
+
+
+# Runs `factory` and records the outcome as one deployment run; the result gets
+# the run id so callers can look the run up later
+async def track(
+    target_id,
+    operation: str,
+    factory,
+    user=None,
+    job_id=None,
+):
+    run = {
+        "id": uuid.uuid4(),
+        "target_id": UUID(str(target_id)) if target_id else None,
+        "operation": operation,
+        "user": _user_label(user),
+        "job_id": UUID(str(job_id)) if job_id else None,
+        "started_at": datetime.now(),
+    }
+    clock = monotonic()
+    try:
+        result = await factory()
+    except Exception as e:
+        run.update(
+            status="failed",
+            error=str(e),
+            finished_at=datetime.now(),
+            elapsed=round(monotonic() - clock, 3),
+            steps=[],
+        )
+        run_recorder.submit(run)
+        raise
+
+    if isinstance(result, dict):
+        if result.get("skipped"):
+            status = "skipped"
+        else:
+            status = "succeeded" if result.get("success", True) else "failed"
+        run.update(
+            commit=result.get("commit"),
+            steps=result.get("steps", []),
+            error=None if status != "failed" else result.get("message"),
+        )
+        result["run_id"] = str(run["id"])
+    else:
+        status = "succeeded"
+        run["steps"] = []
+    run.update(
+        status=status,
+        finished_at=datetime.now(),
+        elapsed=round(monotonic() - clock, 3),
+    )
+    run_recorder.submit(run, result)
+    return result
+
+
+router = APIRouter(
+    prefix="/api/deployments/history",
+    tags=["history"],
+    responses={404: {"description": "Run not found"}},
+)
+
+
+def _parse_cursor(cursor: str):
+    try:
+        started_at, run_id = cursor.split("_", 1)
+        return datetime.fromisoformat(started_at), UUID(run_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("")
+async def list_runs(
+    target_id: Optional[UUID] = None,
+    operation: Optional[str] = None,
+    status: Optional[str] = None,
+    user: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+):
+    limit = max(1, min(limit, 200))
+    stmt = select(DeploymentRun).order_by(
+        DeploymentRun.started_at.desc(), DeploymentRun.id.desc()
+    )
+    if target_id:
+        stmt = stmt.where(DeploymentRun.target_id == target_id)
+    if operation:
+        stmt = stmt.where(DeploymentRun.operation == operation)
+    if status:
+        stmt = stmt.where(DeploymentRun.status == status)
+    if user:
+        stmt = stmt.where(DeploymentRun.user == user)
+    if since:
+        stmt = stmt.where(DeploymentRun.started_at >= since)
+    if until:
+        stmt = stmt.where(DeploymentRun.started_at < until)
+    if cursor:
+        # Keyset pagination: continue strictly after the last row of the page
+        started_at, run_id = _parse_cursor(cursor)
+        stmt = stmt.where(
+            or_(
+                DeploymentRun.started_at < started_at,
+                and_(
+                    DeploymentRun.started_at == started_at,
+                    DeploymentRun.id < run_id,
+                ),
+            )
+        )
+
+    async with db.async_session_maker() as session:
+        result = await session.execute(stmt.limit(limit + 1))
+        runs = list(result.scalars().all())
+
+    next_cursor = None
+    if len(runs) > limit:
+        runs = runs[:limit]
+        last = runs[-1]
+        next_cursor = f"{last.started_at.isoformat()}_{last.id}"
+    return {"runs": [run_to_dict(run) for run in runs], "next_cursor": next_cursor}
+
+
+@router.get("/{run_id}")
+async def get_run(run_id: UUID):
+    async with db.async_session_maker() as session:
+        run = await session.get(DeploymentRun, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return {**run_to_dict(run), "artifact": run.artifact}
+
+
+@router.get("/{run_id}/artifact")
+async def get_run_artifact(run_id: UUID):
+    path = artifact_path(run_id)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    # Served as stored; HTTP clients undo the gzip encoding themselves
+    return FileResponse(
+        path, media_type="application/json", headers={"Content-Encoding": "gzip"}
+    )
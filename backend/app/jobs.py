@@ -0,0 +1,508 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, func, or_, select, update
+
+from app import db
+from app import metrics
+from app.db import Job
+from app.target_locks import target_locks
+from app import history
+
+config_path = os.path.join(os.path.dirname(__file__), "../../config.json")
+with open(config_path) as config_file:
+    config = json.load(config_file)
+
+jobs_config = config["backend"].get("jobs", {})
+
+# Identifies this process as the owner of the jobs it runs
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# The job a deployment task is running under, if any; lets the task report its
+# steps without every helper taking a job argument
+current_job: ContextVar[Optional["JobRun"]] = ContextVar("current_job", default=None)
+
+
+async def step(name: str):
+    run = current_job.get()
+    if run is not None:
+        await run.step(name)
+
+
+async def finish_step(status: str, **details):
+    run = current_job.get()
+    if run is not None:
+        await run.finish_step(status, **details)
+
+
+def job_to_dict(job: Job) -> Dict[str, Any]:
+    return {
+        "id": str(job.id),
+        "kind": job.kind,
+        "target_id": str(job.target_id) if job.target_id else None,
+        "status": job.status,
+        "params": job.params,
+        "steps": job.steps,
+        "error": job.error,
+        "created_by": job.created_by,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+# Step progress of one running job, written through to its row
+class JobRun:
+    def __init__(self, queue: "JobQueue", job_id: UUID):
+        self.queue = queue
+        self.job_id = job_id
+        self.steps: List[Dict[str, Any]] = []
+
+    def _close_step(self, status: str, **details):
+        if self.steps and self.steps[-1]["status"] == "running":
+            current = self.steps[-1]
+            current.update(details)
+            finished = datetime.now()
+            current["status"] = status
+            current["finished_at"] = finished.isoformat()
+            current["elapsed"] = round(
+                (
+                    finished - datetime.fromisoformat(current["started_at"])
+                ).total_seconds(),
+                3,
+            )
+
+    async def step(self, name: str):
+        self._close_step("succeeded")
+        self.steps.append(
+            {
+                "name": name,
+                "status": "running",
+                "started_at": datetime.now().isoformat(),
+                "finished_at": None,
+                "elapsed": None,
+            }
+        )
+        await self.queue._update(self.job_id, steps=[dict(s) for s in self.steps])
+
+    async def finish_step(self, status: str, **details):
+        self._close_step(status, **details)
+        await self.queue._update(self.job_id, steps=[dict(s) for s in self.steps])
+
+
+def _owner_is_dead(owner: Optional[str]) -> bool:
+    # Only decidable for owners on this host: is their process still there?
+    try:
+        host, pid, _ = owner.split(":")
+        if host != socket.gethostname():
+            return False
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except (AttributeError, ValueError, PermissionError):
+        return False
+    return False
+
+
+# Deployment jobs persisted in the job table and run by a fixed pool of workers.
+# A job only starts when its target has fewer than `per_target_limit` jobs
+# running, so a busy target never holds up the others. Several server processes
+# can share the table: idle workers poll it for queued jobs, a job is claimed
+# with a conditional UPDATE so only one of them runs it, and running jobs carry
+# a heartbeat so a process that died mid-job is told apart from one that is
+# still working.
+class JobQueue:
+    def __init__(
+        self,
+        workers: int = 4,
+        per_target_limit: int = 1,
+        retention_days: float = 30,
+        heartbeat_interval: float = 10,
+        stale_after: float = 60,
+        poll_interval: float = 2,
+    ):
+        self.workers = workers
+        self.per_target_limit = per_target_limit
+        self.retention_days = retention_days
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.handlers: Dict[str, Callable[..., Awaitable[Dict[str, Any]]]] = {}
+        # Jobs handed to a worker here, by id and by target key
+        self._taken: set = set()
+        self._running: Dict[str, int] = {}
+        self._queued = 0
+        self._cond = asyncio.Condition()
+        self._tasks: List[asyncio.Task] = []
+
+    def register(self, kind: str, handler: Callable[..., Awaitable[Dict[str, Any]]]):
+        self.handlers[kind] = handler
+
+    async def start(self):
+        self._cond = asyncio.Condition()
+        await self.fail_abandoned()
+        now = datetime.now()
+        async with db.async_session_maker() as session:
+            await session.execute(
+                delete(Job).where(
+                    Job.finished_at < now - timedelta(days=self.retention_days)
+                )
+            )
+            await session.commit()
+            queued = await session.scalar(
+                select(func.count()).select_from(Job).where(Job.status == "queued")
+            )
+        if queued:
+            logging.info(f"[Jobs] Resuming {queued} queued jobs")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # Fails running jobs whose worker is gone: no heartbeat for `stale_after`
+    # seconds, or an owner process on this host that no longer exists
+    async def fail_abandoned(self) -> int:
+        now = datetime.now()
+        cutoff = now - timedelta(seconds=self.stale_after)
+        async with db.async_session_maker() as session:
+            result = await session.execute(
+                select(Job.id, Job.owner, Job.heartbeat_at).where(
+                    Job.status == "running",
+                    or_(Job.owner.is_(None), Job.owner != WORKER_ID),
+                )
+            )
+            abandoned = [
+                job_id
+                for job_id, owner, heartbeat_at in result.all()
+                if heartbeat_at is None
+                or heartbeat_at < cutoff
+                or _owner_is_dead(owner)
+            ]
+            if not abandoned:
+                return 0
+            await session.execute(
+                update(Job)
+                .where(Job.id.in_(abandoned), Job.status == "running")
+                .values(
+                    status="failed",
+                    error="Interrupted: the worker running it stopped",
+                    finished_at=now,
+                )
+            )
+            await session.commit()
+        logging.info(f"[Jobs] Failed {len(abandoned)} abandoned jobs")
+        return len(abandoned)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                async with db.async_session_maker() as session:
+                    await session.execute(
+                        update(Job)
+                        .where(Job.owner == WORKER_ID, Job.status == "running")
+                        .values(heartbeat_at=datetime.now())
+                    )
+                    await session.commit()
+                await self.fail_abandoned()
+            except Exception as e:
+                logging.info(f"[Jobs] Heartbeat failed: {str(e)}")
+
+    @staticmethod
+    def _key(job_id: UUID, target_id: Optional[UUID]) -> str:
+        # Jobs without a target are only bounded by the worker count
+        return str(target_id) if target_id else f"job:{job_id}"
+
+    async def submit(
+        self,
+        kind: str,
+        params: Dict[str, Any],
+        target_id: Optional[UUID] = None,
+        user=None,
+    ) -> Dict[str, Any]:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        params = jsonable_encoder(params)
+        existing = await self._find_pending(kind, params, target_id)
+        if existing is not None:
+            # The same job is already waiting or running for this target
+            logging.info(f"[Jobs] Coalesced {kind} with job {existing.id}")
+            return {**job_to_dict(existing), "coalesced": True}
+        job = Job(
+            kind=kind,
+            target_id=target_id,
+            status="queued",
+            params=params,
+            steps=[],
+            created_by=getattr(user, "email", None),
+            created_at=datetime.now(),
+        )
+        async with db.async_session_maker() as session:
+            session.add(job)
+            await session.commit()
+        logging.info(f"[Jobs] Queued {kind} job {job.id}")
+
+        # Wake the local workers now instead of at their next poll
+        async with self._cond:
+            self._cond.notify_all()
+        return job_to_dict(job)
+
+    async def _find_pending(
+        self, kind: str, params: Dict[str, Any], target_id: Optional[UUID]
+    ) -> Optional[Job]:
+        if target_id is None:
+            return None
+        stmt = select(Job).where(
+            Job.kind == kind,
+            Job.target_id == target_id,
+            Job.status.in_(["queued", "running"]),
+        )
+        async with db.async_session_maker() as session:
+            result = await session.execute(stmt)
+            for job in result.scalars():
+                if job.params == params:
+                    return job
+        return None
+
+    async def get(self, job_id: UUID) -> Optional[Job]:
+        async with db.async_session_maker() as session:
+            return await session.get(Job, job_id)
+
+    async def list(
+        self,
+        status: Optional[str] = None,
+        target_id: Optional[UUID] = None,
+        kind: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[Job]:
+        stmt = select(Job).order_by(Job.created_at.desc()).limit(limit)
+        if status:
+            stmt = stmt.where(Job.status == status)
+        if target_id:
+            stmt = stmt.where(Job.target_id == target_id)
+        if kind:
+            stmt = stmt.where(Job.kind == kind)
+        async with db.async_session_maker() as session:
+            result = await session.execute(stmt)
+            return list(result.scalars().all())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": WORKER_ID,
+            "workers": self.workers if self._tasks else 0,
+            "per_target_limit": self.per_target_limit,
+            "pending": self._queued,
+            "running": sum(self._running.values()),
+            "running_per_target": dict(self._running),
+        }
+
+    async def _update(self, job_id: UUID, **values):
+        async with db.async_session_maker() as session:
+            await session.execute(update(Job).where(Job.id == job_id).values(**values))
+            await session.commit()
+
+    async def _poll(self) -> Optional[tuple]:
+        # Oldest queued job whose target still has room, counting the jobs other
+        # processes are running. Another process may take it first; _claim
+        # settles that.
+        async with db.async_session_maker() as session:
+            queued = (
+                await session.execute(
+                    select(Job.id, Job.target_id)
+                    .where(Job.status == "queued")
+                    .order_by(Job.created_at)
+                    .limit(100)
+                )
+            ).all()
+            if not queued:
+                self._queued = 0
+                return None
+            running = await session.execute(
+                select(Job.target_id, func.count())
+                .where(
+                    Job.status == "running",
+                    Job.target_id.is_not(None),
+                    or_(Job.owner.is_(None), Job.owner != WORKER_ID),
+                )
+                .group_by(Job.target_id)
+            )
+            elsewhere = {str(target_id): count for target_id, count in running}
+        self._queued = len(queued)
+        for job_id, target_id in queued:
+            key = self._key(job_id, target_id)
+            busy = self._running.get(key, 0) + elsewhere.get(key, 0)
+            if job_id not in self._taken and busy < self.per_target_limit:
+                return job_id, key
+        return None
+
+    async def _next(self) -> tuple:
+        async with self._cond:
+            while True:
+                try:
+                    found = await self._poll()
+                except Exception as e:
+                    logging.info(f"[Jobs] Polling the job table failed: {str(e)}")
+                    found = None
+                if found is not None:
+                    job_id, key = found
+                    self._taken.add(job_id)
+                    self._running[key] = self._running.get(key, 0) + 1
+                    return job_id, key
+                try:
+                    await asyncio.wait_for(self._cond.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _worker(self):
+        while True:
+            job_id, key = await self._next()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logging.info(f"[Jobs] Job {job_id} could not be recorded: {str(e)}")
+            finally:
+                async with self._cond:
+                    self._taken.discard(job_id)
+                    self._running[key] -= 1
+                    if not self._running[key]:
+                        del self._running[key]
+                    self._cond.notify_all()
+
+    async def _claim(self, job_id: UUID) -> bool:
+        # Only one process can move the row out of "queued"
+        now = datetime.now()
+        async with db.async_session_maker() as session:
+            result = await session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "queued")
+                .values(
+                    status="running",
+                    owner=WORKER_ID,
+                    started_at=now,
+                    heartbeat_at=now,
+                )
+            )
+            await session.commit()
+        return result.rowcount == 1
+
+    async def _run(self, job_id: UUID):
+        if not await self._claim(job_id):
+            return
+        job = await self.get(job_id)
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            await self._update(
+                job_id,
+                status="failed",
+                error=f"Unknown job kind: {job.kind}",
+                finished_at=datetime.now(),
+            )
+            return
+
+        logging.info(f"[Jobs] Running {job.kind} job {job_id}")
+        metrics.set_endpoint(f"job:{job.kind}")
+        run = JobRun(self, job_id)
+        token = current_job.set(run)
+        result, error = None, None
+        try:
+            if job.target_id:
+                # Same lock as the synchronous endpoints, so a job never
+                # interleaves with a direct call on the same target
+                result = await target_locks.run(
+                    job.target_id,
+                    job.kind,
+                    job.params,
+                    lambda: history.track(
+                        job.target_id,
+                        job.kind,
+                        lambda: handler(**job.params),
+                        user=job.created_by,
+                        job_id=job_id,
+                    ),
+                )
+            else:
+                result = await handler(**job.params)
+            success = not isinstance(result, dict) or result.get("success", True)
+            status = "succeeded" if success else "failed"
+        except Exception as e:
+            logging.info(f"[Jobs] {job.kind} job {job_id} failed: {str(e)}")
+            status, error = "failed", str(e)
+        finally:
+            current_job.reset(token)
+
+        # Steps record their own result; one still open here either finished
+        # normally or was cut short by an exception
+        run._close_step("failed" if error else "succeeded")
+        await self._update(
+            job_id,
+            status=status,
+            steps=run.steps,
+            result=jsonable_encoder(result),
+            error=error,
+            finished_at=datetime.now(),
+        )
+        logging.info(f"[Jobs] {job.kind} job {job_id} {status}")
+
+
+job_queue = JobQueue(
+    workers=jobs_config.get("workers", 4),
+    per_target_limit=jobs_config.get("per_target_limit", 1),
+    retention_days=jobs_config.get("retention_days", 30),
+    heartbeat_interval=jobs_config.get("heartbeat_interval", 10),
+    stale_after=jobs_config.get("stale_after", 60),
+    poll_interval=jobs_config.get("poll_interval", 2),
+)
+
+router = APIRouter(
+    prefix="/api/jobs",
+    tags=["jobs"],
+    responses={404: {"description": "Job not found"}},
+)
+
+
+@router.get("")
+async def list_jobs(
+    status: Optional[str] = None,
+    target_id: Optional[UUID] = None,
+    kind: Optional[str] = None,
+    limit: int = 50,
+):
+    jobs = await job_queue.list(
+        status=status, target_id=target_id, kind=kind, limit=max(1, min(limit, 500))
+    )
+    return {"jobs": [job_to_dict(job) for job in jobs], "queue": job_queue.stats()}
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: UUID):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: UUID):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "id": str(job.id),
+        "status": job.status,
+        "result": job.result,
+        "error": job.error,
+    }
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+
+_CLOSED = object()
+
+
+class _Subscriber:
+    def __init__(self, queue_size: int, line_filter: Optional[Callable] = None):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.line_filter = line_filter
+        self.dropped = 0
+
+    def push(self, line):
+        if line is not _CLOSED and self.line_filter and not self.line_filter(line):
+            return
+        # A slow client loses its oldest lines instead of stalling everyone else
+        while True:
+            try:
+                self.queue.put_nowait(line)
+                return
+            except asyncio.QueueFull:
+                self.queue.get_nowait()
+                self.dropped += 1
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        line = await self.queue.get()
+        if line is _CLOSED:
+            raise StopAsyncIteration
+        return line
+
+
+# One `tail -f` per log file, fanned out to every subscriber of that file
+class _Follower:
+    def __init__(self, log_file: str, backlog: int):
+        self.log_file = log_file
+        self.backlog = deque(maxlen=backlog)
+        self.subscribers = set()
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.task: Optional[asyncio.Task] = None
+        self.lines = 0
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            "tail",
+            "-f",
+            self.log_file,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        self.task = asyncio.create_task(self._pump())
+        logging.info(f"[Log Hub] Following {self.log_file}")
+
+    async def _pump(self):
+        try:
+            while True:
+                raw = await self.process.stdout.readline()
+                if not raw:
+                    break
+                line = raw.decode(errors="replace")
+                self.lines += 1
+                self.backlog.append(line)
+                for subscriber in list(self.subscribers):
+                    subscriber.push(line)
+        finally:
+            for subscriber in list(self.subscribers):
+                subscriber.push(_CLOSED)
+
+    async def stop(self):
+        logging.info(f"[Log Hub] Stopping follower for {self.log_file}")
+        if self.process and self.process.returncode is None:
+            try:
+                self.process.kill()
+            except ProcessLookupError:
+                pass
+            await self.process.wait()
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+
+class LogHub:
+    def __init__(self, backlog: int = 100, queue_size: int = 1000):
+        self.backlog = backlog
+        self.queue_size = queue_size
+        self._followers: Dict[str, _Follower] = {}
+        self._lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def subscribe(self, log_file: str, line_filter: Optional[Callable] = None):
+        subscriber = _Subscriber(self.queue_size, line_filter)
+        async with self._lock:
+            follower = self._followers.get(log_file)
+            if follower is None or follower.task.done():
+                follower = _Follower(log_file, self.backlog)
+                await follower.start()
+                self._followers[log_file] = follower
+            # Replay the recent lines so a new viewer is not staring at nothing
+            for line in follower.backlog:
+                subscriber.push(line)
+            follower.subscribers.add(subscriber)
+        try:
+            yield subscriber
+        finally:
+            async with self._lock:
+                follower.subscribers.discard(subscriber)
+                if not follower.subscribers:
+                    if self._followers.get(log_file) is follower:
+                        del self._followers[log_file]
+                    await follower.stop()
+
+    def subscriber_count(self) -> int:
+        return sum(len(f.subscribers) for f in self._followers.values())
+
+    def stats(self) -> Dict:
+        return {
+            "followers": len(self._followers),
+            "subscribers": self.subscriber_count(),
+            "files": {
+                log_file: {
+                    "subscribers": len(follower.subscribers),
+                    "lines": follower.lines,
+                    "dropped": sum(s.dropped for s in follower.subscribers),
+                    "running": not follower.task.done(),
+                }
+                for log_file, follower in self._followers.items()
+            },
+        }
+
+    async def close(self):
+        async with self._lock:
+            followers = list(self._followers.values())
+            self._followers.clear()
+        for follower in followers:
+            await follower.stop()
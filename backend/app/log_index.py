@@ -0,0 +1,503 @@
+import bisect
+import logging
+import os
+import re
+import threading
+from array import array
+from itertools import chain
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# The builder parses this much at a time outside the lock and only holds the
+# lock to merge the result, so searches never wait on a whole file
+READ_CHUNK = 1024 * 1024
+TAIL_BLOCK = 1024 * 1024
+# Roughly 4 bytes per posting entry, so about 20 MB of postings per file
+DEFAULT_MAX_POSTINGS = 5_000_000
+
+LEVELS = ["TRACE", "DEBUG", "INFO", "WARN", "ERROR", "FATAL"]
+LEVEL_ALIASES = {"WARNING": "WARN", "SEVERE": "ERROR", "CRITICAL": "FATAL"}
+LEVEL_RE = re.compile(
+    rb"\b(TRACE|DEBUG|INFO|WARN|WARNING|ERROR|SEVERE|FATAL|CRITICAL)\b"
+)
+TIMESTAMP_RE = re.compile(rb"(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}):(\d{2})")
+TOKEN_RE = re.compile(rb"[a-z0-9_]{2,64}")
+QUERY_TOKEN_RE = re.compile(r"[a-z0-9_]{2,64}")
+
+
+def level_code(level: str) -> int:
+    level = level.upper()
+    return LEVELS.index(LEVEL_ALIASES.get(level, level))
+
+
+def query_tokens(text: str) -> List[str]:
+    return [t for t in QUERY_TOKEN_RE.findall(text.lower()) if not t.isdigit()]
+
+
+def line_level(line: bytes) -> int:
+    match = LEVEL_RE.search(line, 0, 200)
+    return level_code(match.group(1).decode()) if match else -1
+
+
+def line_tokens(line: bytes) -> set:
+    return {t for t in TOKEN_RE.findall(line.lower()) if not t.isdigit()}
+
+
+@lru_cache(maxsize=100000)
+def _minute_timestamp(minute: bytes) -> float:
+    return datetime.strptime(minute.decode(), "%Y-%m-%d %H:%M").timestamp()
+
+
+def line_timestamp(line: bytes) -> Optional[float]:
+    match = TIMESTAMP_RE.search(line, 0, 64)
+    if not match:
+        return None
+    minute = match.group(1) + b" " + match.group(2)
+    return _minute_timestamp(minute) + int(match.group(3))
+
+
+def _reverse_lines(f, start: int, end: int) -> Iterator[Tuple[int, bytes]]:
+    # (offset, line) for the non-empty lines starting in [start, end), last first
+    pos, rest = end, b""
+    while pos > start:
+        size = min(TAIL_BLOCK, pos - start)
+        pos -= size
+        f.seek(pos)
+        parts = (f.read(size) + rest).split(b"\n")
+        offsets = []
+        offset = pos
+        for part in parts:
+            offsets.append(offset)
+            offset += len(part) + 1
+        # Unless we are at `start`, the first part may begin in an earlier block
+        first = 1 if pos > start else 0
+        for i in range(len(parts) - 1, first - 1, -1):
+            if parts[i].strip():
+                yield offsets[i], parts[i].rstrip(b"\r")
+        rest = parts[0] if pos > start else b""
+
+
+# Index of one log file: line start offsets, level and timestamp per line, and
+# an inverted index from token to line numbers. A background thread builds it
+# and keeps it caught up; searches use whatever is indexed so far and scan the
+# rest of the file directly. Postings stop growing at `max_postings` entries;
+# keyword matches on lines past that point are checked against the line text.
+class LogIndex:
+    def __init__(self, path: str, max_postings: int = DEFAULT_MAX_POSTINGS):
+        self.path = path
+        self.max_postings = max_postings
+        self.lock = threading.Lock()
+        self._builder: Optional[threading.Thread] = None
+        self._builder_lock = threading.Lock()
+        self._closed = False
+        self._reset()
+
+    def _reset(self, inode: Optional[int] = None):
+        self.inode = inode
+        self.indexed_to = 0
+        self.offsets = array("Q")
+        self.levels = array("b")
+        self.timestamps = array("d")
+        self.postings: Dict[bytes, array] = {}
+        self.posting_count = 0
+        # Lines [0, posted_lines) are in the postings
+        self.posted_lines = 0
+        # 0 marks lines before the first timestamp in the file
+        self._last_ts = 0.0
+
+    @property
+    def building(self) -> bool:
+        return self._builder is not None and self._builder.is_alive()
+
+    def ensure_building(self):
+        with self._builder_lock:
+            if self._closed or self.building:
+                return
+            self._builder = threading.Thread(
+                target=self._build, name=f"log-index:{self.path}", daemon=True
+            )
+            self._builder.start()
+
+    def close(self):
+        self._closed = True
+
+    def _build(self):
+        try:
+            self.update()
+        except Exception as e:
+            logging.info(f"[Log Index] Indexing {self.path} failed: {str(e)}")
+
+    def _parse(self, chunk: bytes, offset: int, first_line: int, post: bool):
+        offsets, levels, timestamps = array("Q"), array("b"), array("d")
+        postings: Dict[bytes, array] = {}
+        count = 0
+        line_no = first_line
+        for line in chunk.splitlines(keepends=True):
+            offsets.append(offset)
+            levels.append(line_level(line))
+            # Continuation lines (stack traces) inherit the previous timestamp
+            timestamp = line_timestamp(line)
+            if timestamp is not None:
+                self._last_ts = timestamp
+            timestamps.append(self._last_ts)
+            if post:
+                for token in line_tokens(line):
+                    posting = postings.get(token)
+                    if posting is None:
+                        posting = postings[token] = array("I")
+                    posting.append(line_no)
+                    count += 1
+            offset += len(line)
+            line_no += 1
+        return offsets, levels, timestamps, postings, count, offset
+
+    # Indexes whatever was appended since the last call. Only the builder
+    # thread calls this, so it reads its own progress without the lock and
+    # takes the lock only to publish each parsed chunk.
+    def update(self) -> int:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            with self.lock:
+                self._reset()
+            return 0
+        if stat.st_ino != self.inode or stat.st_size < self.indexed_to:
+            # Rotated or truncated: the old offsets no longer mean anything
+            with self.lock:
+                self._reset(stat.st_ino)
+
+        added = 0
+        with open(self.path, "rb") as f:
+            f.seek(self.indexed_to)
+            while self.indexed_to < stat.st_size and not self._closed:
+                chunk = f.read(min(READ_CHUNK, stat.st_size - self.indexed_to))
+                if not chunk:
+                    break
+                last_newline = chunk.rfind(b"\n")
+                if last_newline < 0:
+                    if len(chunk) < READ_CHUNK:
+                        break  # only a partial line left; index it once finished
+                    last_newline = len(chunk) - 1
+                post = (
+                    self.posted_lines == len(self.offsets)
+                    and self.posting_count < self.max_postings
+                )
+                offsets, levels, timestamps, postings, count, end = self._parse(
+                    chunk[: last_newline + 1], self.indexed_to, len(self.offsets), post
+                )
+                with self.lock:
+                    self.offsets.extend(offsets)
+                    self.levels.extend(levels)
+                    self.timestamps.extend(timestamps)
+                    if post:
+                        for token, lines in postings.items():
+                            existing = self.postings.get(token)
+                            if existing is None:
+                                self.postings[token] = lines
+                            else:
+                                existing.extend(lines)
+                        self.posting_count += count
+                        self.posted_lines = len(self.offsets)
+                    self.indexed_to = end
+                added += len(offsets)
+                f.seek(self.indexed_to)
+        return added
+
+    def _read_lines(self, line_numbers: List[int]) -> Dict[int, str]:
+        lines = {}
+        with open(self.path, "rb") as f:
+            for line_no in line_numbers:
+                start = self.offsets[line_no]
+                if line_no + 1 < len(self.offsets):
+                    end = self.offsets[line_no + 1]
+                else:
+                    end = self.indexed_to
+                f.seek(start)
+                lines[line_no] = (
+                    f.read(end - start).decode(errors="replace").rstrip("\r\n")
+                )
+        return lines
+
+    def _line_range(self, since: Optional[float], until: Optional[float]):
+        # Log lines are appended in time order, so a time window is a line range
+        lo, hi = 0, len(self.offsets)
+        if since is not None:
+            lo = bisect.bisect_left(self.timestamps, since)
+        if until is not None:
+            hi = bisect.bisect_right(self.timestamps, until)
+        return lo, hi
+
+    def _scan_tail(
+        self, start, end, tokens, regex, min_level, since, until, want, scan_limit
+    ):
+        # Plain newest-first scan of the part of the file not indexed yet
+        results, scanned, last_offset = [], 0, None
+        with open(self.path, "rb") as f:
+            for offset, line in _reverse_lines(f, start, end):
+                if scanned >= scan_limit or len(results) >= want:
+                    break
+                scanned += 1
+                last_offset = offset
+                if min_level is not None and line_level(line) < min_level:
+                    continue
+                if tokens and not tokens.issubset(line_tokens(line)):
+                    continue
+                if since is not None or until is not None:
+                    timestamp = line_timestamp(line)
+                    if timestamp is None:
+                        continue
+                    if since is not None and timestamp < since:
+                        continue
+                    if until is not None and timestamp > until:
+                        continue
+                text = line.decode(errors="replace")
+                if regex is not None and not regex.search(text):
+                    continue
+                results.append((offset, text))
+        return results, scanned, last_offset
+
+    def _tail_result(self, offset: int, text: str) -> Dict:
+        line = text.encode()
+        level = line_level(line)
+        timestamp = line_timestamp(line)
+        return {
+            "line": None,
+            "offset": offset,
+            "level": LEVELS[level] if level >= 0 else None,
+            "timestamp": (
+                datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+            ),
+            "text": text,
+        }
+
+    def search(
+        self,
+        keywords: Optional[str] = None,
+        pattern: Optional[str] = None,
+        level: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        before: Optional[int] = None,
+        before_offset: Optional[int] = None,
+        limit: int = 100,
+        scan_limit: int = 200000,
+    ) -> Dict:
+        # Brings the index up to date in the background; this query does not wait
+        self.ensure_building()
+        regex = re.compile(pattern) if pattern else None
+        min_level = level_code(level) if level else None
+        tokens = {t.encode() for t in query_tokens(keywords or "")}
+
+        try:
+            stat = os.stat(self.path)
+            size, inode = stat.st_size, stat.st_ino
+        except FileNotFoundError:
+            size, inode = 0, None
+        with self.lock:
+            indexed_to = self.indexed_to
+            if inode != self.inode or size < indexed_to:
+                # Rotated since it was indexed: the builder starts over
+                indexed_to = 0
+
+        # The newest lines are the ones not indexed yet: scan those first
+        tail, scanned, tail_offset = [], 0, None
+        end = size if before_offset is None else min(before_offset, size)
+        if before is None and end > indexed_to:
+            tail, scanned, tail_offset = self._scan_tail(
+                indexed_to,
+                end,
+                tokens,
+                regex,
+                min_level,
+                since,
+                until,
+                limit + 1,
+                scan_limit,
+            )
+        tail_done = tail_offset is None or (len(tail) <= limit and scanned < scan_limit)
+
+        results: List[int] = []
+        found = []
+        truncated = exhausted = False
+        last_scanned = last_offset = None
+        if tail_done and len(tail) <= limit and indexed_to:
+            with self.lock:
+                results, indexed_scanned, last_scanned = self._search_indexed(
+                    tokens,
+                    regex,
+                    min_level,
+                    since,
+                    until,
+                    before,
+                    min(end, indexed_to),
+                    limit + 1 - len(tail),
+                    scan_limit - scanned,
+                )
+                scanned += indexed_scanned
+                truncated = len(tail) + len(results) > limit
+                exhausted = scanned >= scan_limit
+                results = results[: limit - len(tail)]
+                texts = self._read_lines(results)
+                found = [
+                    {
+                        "line": line_no + 1,
+                        "offset": self.offsets[line_no],
+                        "level": (
+                            LEVELS[self.levels[line_no]]
+                            if self.levels[line_no] >= 0
+                            else None
+                        ),
+                        "timestamp": (
+                            datetime.fromtimestamp(self.timestamps[line_no]).isoformat()
+                            if self.timestamps[line_no]
+                            else None
+                        ),
+                        "text": texts[line_no],
+                    }
+                    for line_no in results
+                ]
+                if last_scanned is not None:
+                    last_offset = self.offsets[last_scanned]
+
+        # next_before / next_before_offset continue below the last line returned
+        # or, when the scan budget ran out, below the last line looked at
+        next_before, next_before_offset = None, None
+        if len(tail) > limit:
+            tail = tail[:limit]
+            next_before_offset = tail[-1][0]
+        elif not tail_done:
+            next_before_offset = tail_offset
+        elif truncated and found:
+            next_before = found[-1]["line"]
+            next_before_offset = found[-1]["offset"]
+        elif truncated and tail:
+            next_before_offset = tail[-1][0]
+        elif exhausted and last_scanned is not None:
+            next_before = last_scanned + 1
+            next_before_offset = last_offset
+
+        with self.lock:
+            indexed_lines, indexed_bytes = len(self.offsets), self.indexed_to
+        return {
+            "results": [self._tail_result(o, text) for o, text in tail] + found,
+            "next_before": next_before,
+            "next_before_offset": next_before_offset,
+            "indexed_lines": indexed_lines,
+            "indexed_bytes": indexed_bytes,
+            "file_bytes": size,
+            "building": self.building,
+        }
+
+    # The indexed part of a search; runs under the lock
+    def _search_indexed(
+        self, tokens, regex, min_level, since, until, before, end, want, scan_limit
+    ):
+        lo, hi = self._line_range(since, until)
+        # Only lines that start below `end`: the tail scan already covered the rest
+        hi = min(hi, bisect.bisect_left(self.offsets, end))
+        if before is not None:
+            hi = min(hi, before - 1)
+
+        candidates = None
+        posted = min(self.posted_lines, hi)
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting is None:
+                candidates = []
+                break
+            if candidates is None:
+                candidates = posting
+            elif len(posting) < len(candidates):
+                candidates = sorted(set(posting).intersection(candidates))
+            else:
+                candidates = sorted(set(candidates).intersection(posting))
+
+        # Newest first: lines past the postings cap are checked against their
+        # text; below it, posting lists are sorted, so slice then walk backwards
+        if candidates is None:
+            ordered = ((n, False) for n in range(hi - 1, lo - 1, -1))
+        else:
+            start = bisect.bisect_left(candidates, lo)
+            stop = bisect.bisect_left(candidates, posted)
+            ordered = chain(
+                ((n, True) for n in range(hi - 1, max(lo, posted) - 1, -1)),
+                ((candidates[i], False) for i in range(stop - 1, start - 1, -1)),
+            )
+
+        results = []
+        scanned = 0
+        last_scanned = None
+        pending = []
+        for line_no, check_tokens in ordered:
+            if min_level is not None and self.levels[line_no] < min_level:
+                continue
+            if regex is None and not check_tokens:
+                if pending:
+                    # Keep newest-first order with lines still waiting for a text check
+                    scanned += len(pending)
+                    results.extend(self._text_filter(regex, tokens, pending))
+                    pending = []
+                results.append(line_no)
+                if len(results) >= want:
+                    break
+                continue
+            pending.append((line_no, check_tokens))
+            last_scanned = line_no
+            if len(pending) >= 1000:
+                scanned += len(pending)
+                results.extend(self._text_filter(regex, tokens, pending))
+                pending = []
+                if len(results) >= want or scanned >= scan_limit:
+                    break
+        if pending:
+            scanned += len(pending)
+            results.extend(self._text_filter(regex, tokens, pending))
+        return results, scanned, last_scanned
+
+    def _text_filter(self, regex, tokens, pending: List[tuple]) -> List[int]:
+        texts = self._read_lines([n for n, _ in pending])
+        matches = []
+        for line_no, check_tokens in pending:
+            text = texts[line_no]
+            if check_tokens and not tokens.issubset(line_tokens(text.encode())):
+                continue
+            if regex is not None and not regex.search(text):
+                continue
+            matches.append(line_no)
+        return matches
+
+    def stats(self) -> Dict:
+        return {
+            "lines": len(self.offsets),
+            "bytes": self.indexed_to,
+            "tokens": len(self.postings),
+            "postings": self.posting_count,
+            "posted_lines": self.posted_lines,
+            "building": self.building,
+        }
+
+
+# Keeps the indexes of the most recently searched files in memory
+class LogIndexRegistry:
+    def __init__(self, max_files: int = 8, max_postings: int = DEFAULT_MAX_POSTINGS):
+        self.max_files = max_files
+        self.max_postings = max_postings
+        self._indexes: "OrderedDict[str, LogIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> LogIndex:
+        with self._lock:
+            index = self._indexes.get(path)
+            if index is None:
+                index = self._indexes[path] = LogIndex(path, self.max_postings)
+            self._indexes.move_to_end(path)
+            while len(self._indexes) > self.max_files:
+                _, evicted = self._indexes.popitem(last=False)
+                evicted.close()
+            return index
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {path: index.stats() for path, index in self._indexes.items()}
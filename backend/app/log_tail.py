@@ -0,0 +1,70 @@
+import os
+from typing import Dict
+
+BLOCK_SIZE = 64 * 1024
+MAX_READ_BYTES = 4 * 1024 * 1024
+
+
+# Reads backwards from the end of the file in blocks, so the cost depends on the
+# number of lines asked for rather than on the size of the file
+def tail_lines(path: str, lines: int, block_size: int = BLOCK_SIZE) -> Dict:
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        pos = end
+        chunks = []
+        newlines = 0
+        while pos > 0 and newlines <= lines:
+            size = min(block_size, pos)
+            pos -= size
+            f.seek(pos)
+            chunk = f.read(size)
+            chunks.append(chunk)
+            newlines += chunk.count(b"\n")
+
+    data = b"".join(reversed(chunks))
+    # The cursor points just past the last complete line; a line that is still
+    # being written is returned now and again once it is finished
+    last_newline = data.rfind(b"\n")
+    cursor = pos + last_newline + 1 if last_newline >= 0 else pos
+    recent = data.splitlines(keepends=True)[-lines:] if lines > 0 else []
+    return {
+        "logs": [line.decode(errors="replace") for line in recent],
+        "cursor": cursor,
+        "size": end,
+    }
+
+
+# Returns up to `lines` complete lines appended after `cursor`
+def read_since(
+    path: str, cursor: int, lines: int, max_bytes: int = MAX_READ_BYTES
+) -> Dict:
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        if cursor > end:
+            # The file was truncated or rotated; start over from its tail
+            result = tail_lines(path, lines)
+            result["reset"] = True
+            return result
+        f.seek(cursor)
+        data = f.read(min(max_bytes, end - cursor))
+
+    last_newline = data.rfind(b"\n")
+    if last_newline >= 0:
+        complete = data[: last_newline + 1]
+    elif len(data) == max_bytes:
+        # A single line longer than max_bytes; hand it out in pieces
+        complete = data
+    else:
+        complete = b""
+    new_lines = complete.splitlines(keepends=True)[: max(lines, 0)]
+    next_cursor = cursor + sum(len(line) for line in new_lines)
+    remaining = end - next_cursor
+    return {
+        "logs": [line.decode(errors="replace") for line in new_lines],
+        "cursor": next_cursor,
+        "size": end,
+        "more": remaining > 0 and (len(new_lines) == lines or len(data) == max_bytes),
+        "reset": False,
+    }
@@ -0,0 +1,223 @@
+import bisect
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+from sqlalchemy import event
+
+# Prometheus text exposition without the client library: histograms and
+# callback gauges, each update being a dict lookup and a few adds
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry: List["_Metric"] = []
+
+# Either the ASGI scope of the request being served, or a label set explicitly
+# (e.g. for queued jobs); read lazily so the route is known by the time we ask
+_endpoint: ContextVar[Union[dict, str, None]] = ContextVar("endpoint", default=None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        _registry.append(self)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        pass
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(),
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        lines = []
+        for labels, (counts, total, count) in list(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}"
+                )
+            lines.append(
+                f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}"
+            )
+            lines.append(
+                f"{self.name}_count{_labels(self.label_names, labels)} {count}"
+            )
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    # `collect` returns a number, or a dict of label value tuples to numbers;
+    # it only runs when /metrics is scraped
+    def __init__(self, name, documentation, collect: Callable, labels=()):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+
+    def samples(self):
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f"{self.name}{_labels(self.label_names, k)} {_number(v)}"
+            for k, v in values.items()
+        ]
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            lines.append(f"# {metric.name} unavailable: {_escape(str(e))}")
+    return "\n".join(lines) + "\n"
+
+
+http_request_duration = Histogram(
+    "cmdserver_http_request_duration_seconds",
+    "Time until the response headers are sent, per route",
+    labels=("method", "route", "status"),
+)
+subprocess_duration = Histogram(
+    "cmdserver_subprocess_duration_seconds",
+    "Run time of spawned subprocesses, per endpoint",
+    labels=("endpoint",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600),
+)
+db_query_duration = Histogram(
+    "cmdserver_db_query_duration_seconds",
+    "Database statement latency",
+    labels=("statement",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+
+def set_endpoint(label: str):
+    _endpoint.set(label)
+
+
+def endpoint_label() -> str:
+    current = _endpoint.get()
+    if isinstance(current, dict):
+        return route_label(current)
+    return current or "background"
+
+
+def route_label(scope: dict) -> str:
+    # The route template, not the raw path, to keep ids out of the labels
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+@contextmanager
+def track_subprocess():
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        subprocess_duration.observe(perf_counter() - started, endpoint_label())
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = perf_counter()
+        recorded = False
+        token = _endpoint.set(scope)
+
+        async def send_with_metrics(message):
+            nonlocal recorded
+            if message["type"] == "http.response.start" and not recorded:
+                recorded = True
+                http_request_duration.observe(
+                    perf_counter() - started,
+                    scope["method"],
+                    route_label(scope),
+                    str(message["status"]),
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        except Exception:
+            if not recorded:
+                http_request_duration.observe(
+                    perf_counter() - started, scope["method"], route_label(scope), "500"
+                )
+            raise
+        finally:
+            _endpoint.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+        db_query_duration.observe(perf_counter() - started, verb)
+
+
+def instrument_engine(engine):
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+import re
+import signal
+import threading
+from time import monotonic
+from typing import Dict, List, NamedTuple, Optional
+
+config_path = os.path.join(os.path.dirname(__file__), "../../config.json")
+with open(config_path) as config_file:
+    config = json.load(config_file)
+
+processes_config = config["backend"].get("processes", {})
+
+
+class ProcInfo(NamedTuple):
+    pid: int
+    name: str
+    cmdline: str
+    cwd: Optional[str]
+    start_time: int
+
+
+def _read(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _stat_fields(pid: int) -> Optional[List[str]]:
+    stat = _read(f"/proc/{pid}/stat")
+    if stat is None:
+        return None
+    # The command name is in parentheses and may itself contain spaces
+    return stat[stat.rfind(b")") + 2 :].decode().split()
+
+
+def _start_time(pid: int) -> Optional[int]:
+    fields = _stat_fields(pid)
+    return int(fields[19]) if fields else None
+
+
+def is_alive(proc: ProcInfo) -> bool:
+    fields = _stat_fields(proc.pid)
+    # Gone, a zombie, or the pid was reused by a different process
+    return bool(fields) and fields[0] != "Z" and int(fields[19]) == proc.start_time
+
+
+def scan_proc() -> List[ProcInfo]:
+    procs = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        raw = _read(f"/proc/{pid}/cmdline")
+        if not raw:
+            continue  # kernel threads and processes that already exited
+        args = raw.rstrip(b"\0").split(b"\0")
+        start_time = _start_time(pid)
+        if start_time is None:
+            continue
+        try:
+            cwd = os.readlink(f"/proc/{pid}/cwd")
+        except OSError:
+            cwd = None
+        procs.append(
+            ProcInfo(
+                pid=pid,
+                name=os.path.basename(args[0].decode(errors="replace")),
+                cmdline=b" ".join(args).decode(errors="replace"),
+                cwd=cwd,
+                start_time=start_time,
+            )
+        )
+    return procs
+
+
+# One /proc scan shared by every caller for `refresh_interval` seconds, replacing
+# the pidof/pwdx/ps/pgrep pipelines
+class ProcessIndex:
+    def __init__(self, refresh_interval: float = 2):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._procs: List[ProcInfo] = []
+        self._scanned_at: Optional[float] = None
+
+    def snapshot(self) -> List[ProcInfo]:
+        with self._lock:
+            if (
+                self._scanned_at is None
+                or monotonic() - self._scanned_at >= self.refresh_interval
+            ):
+                self._procs = scan_proc()
+                self._scanned_at = monotonic()
+            return self._procs
+
+    def invalidate(self):
+        with self._lock:
+            self._scanned_at = None
+
+    # The engine's java process runs from, or names, <source_path>/server
+    def engine_processes(self, source_path: str) -> List[ProcInfo]:
+        server_dir = f"{source_path}/server"
+        return [
+            proc
+            for proc in self.snapshot()
+            if proc.name == "java"
+            and (
+                (proc.cwd is not None and server_dir in proc.cwd)
+                or server_dir in proc.cmdline
+            )
+        ]
+
+    def coengine_processes(self, source_path: str) -> List[ProcInfo]:
+        pattern = re.compile(f"python.*{re.escape(source_path)}/pyastackcore")
+        return [proc for proc in self.snapshot() if pattern.search(proc.cmdline)]
+
+    async def terminate(self, procs: List[ProcInfo], grace: float = 10) -> Dict:
+        # SIGTERM, give the processes `grace` seconds to exit, then SIGKILL
+        signalled = []
+        for proc in procs:
+            if is_alive(proc):
+                try:
+                    os.kill(proc.pid, signal.SIGTERM)
+                    signalled.append(proc)
+                except ProcessLookupError:
+                    pass
+                except PermissionError as e:
+                    return {"success": False, "error": str(e), "pids": []}
+
+        deadline = monotonic() + grace
+        remaining = signalled
+        while remaining and monotonic() < deadline:
+            await asyncio.sleep(0.2)
+            remaining = [proc for proc in remaining if is_alive(proc)]
+
+        killed = []
+        for proc in remaining:
+            if is_alive(proc):
+                try:
+                    os.kill(proc.pid, signal.SIGKILL)
+                    killed.append(proc.pid)
+                except ProcessLookupError:
+                    pass
+        deadline = monotonic() + 5
+        while killed and monotonic() < deadline:
+            if not any(is_alive(proc) for proc in remaining):
+                break
+            await asyncio.sleep(0.1)
+
+        self.invalidate()
+        return {
+            "success": True,
+            "pids": [proc.pid for proc in signalled],
+            "terminated": [proc.pid for proc in signalled if proc.pid not in killed],
+            "killed": killed,
+        }
+
+
+process_index = ProcessIndex(
+    refresh_interval=processes_config.get("refresh_interval", 2)
+)
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import socket
+from time import monotonic
+from typing import Dict, Optional
+
+
+def port_open(port: int, host: str = "127.0.0.1", timeout: float = 0.5) -> bool:
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def truncate_log(path: str):
+    # Empties the log the way the start command's `>` will, but before the
+    # engine starts, so a scan from offset 0 can only see the new output
+    try:
+        with open(path, "r+b") as f:
+            f.truncate(0)
+    except FileNotFoundError:
+        pass
+
+
+async def wait_for_port_closed(
+    port: int, timeout: float, interval: float = 0.5, host: str = "127.0.0.1"
+) -> bool:
+    deadline = monotonic() + timeout
+    while monotonic() < deadline:
+        if not await asyncio.to_thread(port_open, port, host):
+            return True
+        await asyncio.sleep(interval)
+    return False
+
+
+class _MarkerScanner:
+    # Follows a log file from `offset`, starting over if it shrinks below the
+    # offset or is replaced by a different file
+    def __init__(self, path: str, marker: str, offset: int):
+        self.path = path
+        self.marker = marker.encode()
+        self.offset = offset
+        self.tail = b""
+        try:
+            self.inode: Optional[int] = os.stat(path).st_ino
+        except OSError:
+            self.inode = None
+
+    def found(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        size = st.st_size
+        replaced = self.inode is not None and st.st_ino != self.inode
+        self.inode = st.st_ino
+        if replaced or size < self.offset:
+            self.offset = 0
+            self.tail = b""
+        if size == self.offset:
+            return False
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        self.offset += len(data)
+        data = self.tail + data
+        if self.marker in data:
+            return True
+        # Keep enough bytes to match a marker split across two reads
+        self.tail = data[-len(self.marker) :]
+        return False
+
+
+async def wait_until_ready(
+    port: Optional[int] = None,
+    log_file: Optional[str] = None,
+    marker: Optional[str] = None,
+    log_offset: int = 0,
+    timeout: float = 120,
+    interval: float = 1,
+    host: str = "127.0.0.1",
+) -> Dict:
+    started = monotonic()
+    scanner = _MarkerScanner(log_file, marker, log_offset) if marker else None
+    while True:
+        # A configured marker line is the stronger signal, so it wins over the port
+        if scanner:
+            if await asyncio.to_thread(scanner.found):
+                method = "marker"
+                break
+        elif port and await asyncio.to_thread(port_open, port, host):
+            method = "port"
+            break
+        if monotonic() - started >= timeout:
+            return {
+                "ready": False,
+                "method": None,
+                "elapsed": round(monotonic() - started, 2),
+                "message": f"Engine not ready after {timeout}s",
+            }
+        await asyncio.sleep(interval)
+    return {
+        "ready": True,
+        "method": method,
+        "elapsed": round(monotonic() - started, 2),
+    }
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+
+# One authenticated transport per host alias. Paramiko multiplexes channels over a
+# single transport, so "sessions" are channels opened on that shared connection.
+class _HostEntry:
+    def __init__(self, hostname: str, max_sessions: int):
+        self.hostname = hostname
+        self.client = None
+        self.lock = threading.Lock()
+        self.sessions = threading.BoundedSemaphore(max_sessions)
+        self.max_sessions = max_sessions
+        self.in_use = 0
+        self.connected_at: Optional[float] = None
+        self.last_used = time.monotonic()
+        self.acquired = 0
+        self.connects = 0
+        self.reconnects = 0
+        self.failures = 0
+
+    def is_active(self) -> bool:
+        return self.client is not None and self.client.is_active()
+
+    def close(self):
+        if self.client is not None:
+            try:
+                self.client.close()
+            except Exception as e:
+                logging.info(f"[SSH Pool] Error closing {self.hostname}: {str(e)}")
+        self.client = None
+        self.connected_at = None
+
+
+class SSHConnectionPool:
+    def __init__(
+        self,
+        client_factory: Callable,
+        max_sessions_per_host: int = 4,
+        idle_timeout: float = 300,
+        keepalive_interval: int = 30,
+        acquire_timeout: float = 60,
+    ):
+        self.client_factory = client_factory
+        self.max_sessions_per_host = max_sessions_per_host
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.acquire_timeout = acquire_timeout
+        self._hosts: Dict[str, _HostEntry] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _entry(self, hostname: str) -> _HostEntry:
+        with self._lock:
+            entry = self._hosts.get(hostname)
+            if entry is None:
+                entry = _HostEntry(hostname, self.max_sessions_per_host)
+                self._hosts[hostname] = entry
+            self._start_reaper()
+            return entry
+
+    def _start_reaper(self):
+        if self._reaper is None or not self._reaper.is_alive():
+            self._stop.clear()
+            self._reaper = threading.Thread(
+                target=self._reap_loop, name="ssh-pool-reaper", daemon=True
+            )
+            self._reaper.start()
+
+    def _reap_loop(self):
+        interval = max(1.0, min(self.idle_timeout / 2, 60))
+        while not self._stop.wait(interval):
+            self.evict_idle()
+
+    def _ensure_connected(self, entry: _HostEntry):
+        # Called with entry.lock held
+        if entry.is_active():
+            return
+        had_client = entry.client is not None
+        entry.close()
+        client = self.client_factory(entry.hostname)
+        if not client.connect():
+            entry.failures += 1
+            raise ConnectionError(f"Failed to establish SSH connection to {entry.hostname}")
+        client.set_keepalive(self.keepalive_interval)
+        entry.client = client
+        entry.connected_at = time.monotonic()
+        entry.connects += 1
+        if had_client:
+            entry.reconnects += 1
+            logging.info(f"[SSH Pool] Reconnected to {entry.hostname}")
+        else:
+            logging.info(f"[SSH Pool] Connected to {entry.hostname}")
+
+    @contextmanager
+    def session(self, hostname: str):
+        entry = self._entry(hostname)
+        if not entry.sessions.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(
+                f"No SSH session available for {hostname} "
+                f"(limit {entry.max_sessions} per host)"
+            )
+        try:
+            with entry.lock:
+                self._ensure_connected(entry)
+                entry.in_use += 1
+                entry.acquired += 1
+                client = entry.client
+            try:
+                yield client
+            finally:
+                with entry.lock:
+                    entry.in_use -= 1
+                    entry.last_used = time.monotonic()
+        finally:
+            entry.sessions.release()
+
+    def invalidate(self, hostname: str, client):
+        # Drop a transport that failed mid-use; the next session() reconnects it
+        entry = self._entry(hostname)
+        with entry.lock:
+            if entry.client is client:
+                logging.info(f"[SSH Pool] Dropping broken connection to {hostname}")
+                entry.close()
+                entry.reconnects += 1
+
+    def evict_idle(self) -> int:
+        now = time.monotonic()
+        evicted = 0
+        with self._lock:
+            entries = list(self._hosts.values())
+        for entry in entries:
+            with entry.lock:
+                if entry.client is None or entry.in_use:
+                    continue
+                if not entry.is_active() or now - entry.last_used > self.idle_timeout:
+                    logging.info(f"[SSH Pool] Closing idle connection to {entry.hostname}")
+                    entry.close()
+                    evicted += 1
+        return evicted
+
+    def close_all(self):
+        self._stop.set()
+        with self._lock:
+            entries = list(self._hosts.values())
+            self._hosts.clear()
+        for entry in entries:
+            with entry.lock:
+                entry.close()
+
+    def sessions_in_use(self) -> int:
+        with self._lock:
+            return sum(entry.in_use for entry in self._hosts.values())
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            entries = list(self._hosts.values())
+        hosts = {}
+        for entry in entries:
+            hosts[entry.hostname] = {
+                "connected": entry.is_active(),
+                "sessions_in_use": entry.in_use,
+                "max_sessions": entry.max_sessions,
+                "acquired": entry.acquired,
+                "connects": entry.connects,
+                "reconnects": entry.reconnects,
+                "failures": entry.failures,
+                "idle_seconds": round(now - entry.last_used, 1),
+                "connected_seconds": (
+                    round(now - entry.connected_at, 1) if entry.connected_at else None
+                ),
+            }
+        return {
+            "max_sessions_per_host": self.max_sessions_per_host,
+            "idle_timeout": self.idle_timeout,
+            "keepalive_interval": self.keepalive_interval,
+            "connected_hosts": sum(1 for h in hosts.values() if h["connected"]),
+            "sessions_in_use": sum(h["sessions_in_use"] for h in hosts.values()),
+            "hosts": hosts,
+        }
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import re
+from datetime import datetime
+from time import monotonic
+from typing import Dict, Optional
+
+from app.procs import process_index
+
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+# Same answer as `git rev-parse --short HEAD`, read straight from .git
+def git_head(repo_path: str, short: int = 7) -> Optional[str]:
+    git_dir = os.path.join(repo_path, ".git")
+    if os.path.isfile(git_dir):
+        # Worktrees and submodules point at the real git dir
+        content = _read_text(git_dir) or ""
+        if content.startswith("gitdir:"):
+            git_dir = os.path.join(repo_path, content[len("gitdir:") :].strip())
+    head = _read_text(os.path.join(git_dir, "HEAD"))
+    if head is None:
+        return None
+    head = head.strip()
+    if not head.startswith("ref:"):
+        return head[:short]
+
+    ref = head[len("ref:") :].strip()
+    sha = _read_text(os.path.join(git_dir, ref))
+    if sha:
+        return sha.strip()[:short]
+    packed = _read_text(os.path.join(git_dir, "packed-refs")) or ""
+    for line in packed.splitlines():
+        if line.endswith(" " + ref):
+            return line.split(" ", 1)[0][:short]
+    return None
+
+
+# Same answer as `sed -n '5s/.*:[[:space:]]*//p' sff.auto.config.cdm | sed 's/ *#.*//'`
+def server_environment(config_file: str) -> Optional[str]:
+    content = _read_text(config_file)
+    if content is None:
+        return None
+    lines = content.splitlines()
+    if len(lines) < 5 or ":" not in lines[4]:
+        return ""
+    value = lines[4].rsplit(":", 1)[1].lstrip()
+    return re.sub(r" *#.*", "", value).strip()
+
+
+# Everything /api/deployment/status reports, gathered in one pass without
+# spawning any processes
+def probe_status(source_path: str) -> Dict:
+    pids = [str(proc.pid) for proc in process_index.engine_processes(source_path)]
+    be_commit = git_head(f"{source_path}/source_code/atprofveolia")
+    ui_commit = git_head(f"{source_path}/source_code/atprofveoliaui")
+    environment = server_environment(f"{source_path}/server/sff.auto.config.cdm")
+    return {
+        "server_running": bool(pids),
+        "server_pid": "\n".join(pids) if pids else None,
+        "current_be_commit": be_commit or "unknown",
+        "current_ui_commit": ui_commit or "unknown",
+        "server_environment": environment if environment is not None else "unknown",
+        "last_updated": datetime.now().isoformat(),
+    }
+
+
+# Caches probe results per source path for a short TTL and lets concurrent
+# callers share a single in-flight probe
+class StatusCache:
+    def __init__(self, ttl: float = 5):
+        self.ttl = ttl
+        self._results: Dict[str, tuple] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generation: Dict[str, int] = {}
+
+    async def get(self, source_path: str) -> Dict:
+        cached = self._results.get(source_path)
+        if cached and monotonic() - cached[0] < self.ttl:
+            return cached[1]
+
+        future = self._inflight.get(source_path)
+        if future is None:
+            future = asyncio.ensure_future(self._probe(source_path))
+            self._inflight[source_path] = future
+        return await asyncio.shield(future)
+
+    async def _probe(self, source_path: str) -> Dict:
+        generation = self._generation.get(source_path, 0)
+        try:
+            result = await asyncio.to_thread(probe_status, source_path)
+            # Do not cache a probe that raced with an invalidation
+            if self._generation.get(source_path, 0) == generation:
+                self._results[source_path] = (monotonic(), result)
+            return result
+        finally:
+            if self._inflight.get(source_path) is asyncio.current_task():
+                del self._inflight[source_path]
+
+    def invalidate(self, source_path: str):
+        self._generation[source_path] = self._generation.get(source_path, 0) + 1
+        self._results.pop(source_path, None)
+        self._inflight.pop(source_path, None)
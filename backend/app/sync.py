@@ -0,0 +1,190 @@
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import shutil
+import stat
+from time import monotonic
+from typing import Dict, Iterable, List
+
+MANIFEST_VERSION = 1
+HASH_CHUNK = 1024 * 1024
+
+# What pull_be_source used to strip from temp_backend before copying into
+# server/: the contents of these directories (the directories themselves are
+# still created) and these files at the top level of the tree
+BACKEND_EXCLUDED_DIRS = [
+    "sff.sqldb.data",
+    "sff.auto.launch",
+    "spaces",
+    "ui",
+    "config",
+]
+BACKEND_EXCLUDED_FILES = [
+    "*.log",
+    "*.out",
+    "*.sh",
+    "*.py",
+    "*.jar",
+    "*.xml",
+    "*.txt",
+    "sff.auto.config.cdm",
+    "sff.auto.config.DEBUG.cdm",
+    "sff.auto.config.docker.cdm",
+]
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(path: str) -> Dict[str, List]:
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        # Unknown layout: fall back to copying everything once
+        return {}
+    return manifest.get("files", {})
+
+
+def save_manifest(path: str, files: Dict[str, List]):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, "files": files}, f)
+    os.replace(tmp_path, path)
+
+
+# Manifest entries are [size, source mtime_ns, content hash, copy mtime_ns]
+def _dest_matches(dest_file: str, entry: List) -> bool:
+    # The copy still looks exactly like what the last deploy left behind
+    size, _, digest, mtime_ns = entry
+    try:
+        st = os.lstat(dest_file)
+    except OSError:
+        return False
+    if digest.startswith("link:"):
+        return stat.S_ISLNK(st.st_mode) and "link:" + os.readlink(dest_file) == digest
+    return (
+        stat.S_ISREG(st.st_mode) and st.st_size == size and st.st_mtime_ns == mtime_ns
+    )
+
+
+def _copy(src_file: str, dest_file: str, is_link: bool):
+    tmp_file = dest_file + ".sync-tmp"
+    if os.path.lexists(tmp_file):
+        os.remove(tmp_file)
+    if is_link:
+        os.symlink(os.readlink(src_file), tmp_file)
+    else:
+        shutil.copy2(src_file, tmp_file)
+    os.replace(tmp_file, dest_file)
+
+
+# One pass from `src` straight into `dest`, copying only files whose content
+# changed since the manifest of the previous sync (or whose copy in `dest` was
+# changed or removed since). Like `rsync -a` without --delete, files that only
+# exist in `dest` are left alone.
+def sync_tree(
+    src: str,
+    dest: str,
+    manifest_path: str,
+    excluded_dirs: Iterable[str] = (),
+    excluded_files: Iterable[str] = (),
+) -> Dict:
+    started = monotonic()
+    if not os.path.isdir(src):
+        raise FileNotFoundError(f"Sync source not found: {src}")
+    excluded_dirs = set(excluded_dirs)
+    excluded_files = list(excluded_files)
+    previous = load_manifest(manifest_path)
+    files: Dict[str, List] = {}
+    result = {
+        "files_scanned": 0,
+        "files_copied": 0,
+        "bytes_copied": 0,
+        "files_unchanged": 0,
+        "files_hashed": 0,
+        "dirs_created": 0,
+    }
+
+    for dirpath, dirnames, filenames in os.walk(src):
+        rel_dir = os.path.relpath(dirpath, src)
+        rel_dir = "" if rel_dir == "." else rel_dir
+        dest_dir = os.path.join(dest, rel_dir)
+        if not os.path.isdir(dest_dir):
+            os.makedirs(dest_dir)
+            result["dirs_created"] += 1
+        if rel_dir in excluded_dirs:
+            dirnames[:] = []
+            continue
+
+        # Symlinked directories are copied as links, like rsync -a does
+        links = [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]
+        dirnames[:] = [d for d in dirnames if d not in links]
+        for name in filenames + links:
+            if not rel_dir and any(fnmatch.fnmatch(name, p) for p in excluded_files):
+                continue
+            rel_path = os.path.join(rel_dir, name)
+            src_file = os.path.join(dirpath, name)
+            st = os.lstat(src_file)
+            is_link = stat.S_ISLNK(st.st_mode)
+            result["files_scanned"] += 1
+
+            entry = previous.get(rel_path)
+            if is_link:
+                digest = "link:" + os.readlink(src_file)
+            elif entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                digest = entry[2]
+            else:
+                digest = file_hash(src_file)
+                result["files_hashed"] += 1
+
+            dest_file = os.path.join(dest, rel_path)
+            if entry and entry[2] == digest and _dest_matches(dest_file, entry):
+                files[rel_path] = [st.st_size, st.st_mtime_ns, digest, entry[3]]
+                result["files_unchanged"] += 1
+                continue
+            _copy(src_file, dest_file, is_link)
+            copied = os.lstat(dest_file)
+            files[rel_path] = [st.st_size, st.st_mtime_ns, digest, copied.st_mtime_ns]
+            result["files_copied"] += 1
+            result["bytes_copied"] += 0 if is_link else st.st_size
+
+    save_manifest(manifest_path, files)
+    result["elapsed"] = round(monotonic() - started, 3)
+    logging.info(f"[Sync] {src} -> {dest}: {result}")
+    return {"success": True, **result}
+
+
+def sync_backend(source_path: str, execute: bool = True) -> Dict:
+    src = f"{source_path}/source_code/atprofveolia/server/"
+    dest = f"{source_path}/server/"
+    if not execute:
+        return {
+            "success": True,
+            "message": "Command execution is disabled",
+            "source": src,
+            "destination": dest,
+        }
+    try:
+        return sync_tree(
+            src,
+            dest,
+            f"{source_path}/source_code/backend.manifest.json",
+            excluded_dirs=BACKEND_EXCLUDED_DIRS,
+            excluded_files=BACKEND_EXCLUDED_FILES,
+        )
+    except Exception as e:
+        logging.info(f"[Sync Error]: {str(e)}")
+        return {"success": False, "error": str(e)}
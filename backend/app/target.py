@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import func, or_, select
 from typing import List, Optional
 from pydantic import BaseModel, UUID4
 from app.db import Target, get_target_db
+from app.target_config import target_configs
+import base64
 import uuid
 
 # Pydantic models for request validation and response serialization
@@ -56,11 +58,69 @@ async def create_target(target: TargetCreate, db: AsyncSession = Depends(get_tar
       await db.rollback()
       raise HTTPException(status_code=500, detail=f"Failed to create target: {str(e)}")
 
+# Cursors are the last server_tag of a page, urlsafe-base64 encoded so any tag
+# fits in a latin-1 header and survives a query string unchanged
+def encode_cursor(server_tag: str) -> str:
+    return base64.urlsafe_b64encode(server_tag.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.b64decode(padded, altchars=b"-_", validate=True).decode()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# List targets ordered by server_tag (unique, so the order is stable). The body
+# stays a plain list; paging details go in headers: X-Next-Cursor holds the
+# cursor for the next page when there is one, X-Total-Count the number of
+# matching targets when count=true
 @router.get("/", response_model=List[TargetResponse])
-async def read_targets(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_target_db)):
-    stmt = select(Target).offset(skip).limit(limit)
-    result = await db.execute(stmt)
+async def read_targets(
+    response: Response,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    skip: int = Query(0, ge=0, description="Offset paging, ignored when cursor is set"),
+    server_role: Optional[str] = None,
+    server_alias: Optional[str] = None,
+    server_status: Optional[bool] = None,
+    prefix: Optional[str] = Query(None, description="Name or server tag prefix"),
+    count: bool = False,
+    db: AsyncSession = Depends(get_target_db),
+):
+    stmt = select(Target)
+    if server_role is not None:
+      stmt = stmt.where(Target.server_role == server_role)
+    if server_alias is not None:
+      stmt = stmt.where(Target.server_alias == server_alias)
+    if server_status is not None:
+      stmt = stmt.where(Target.server_status == server_status)
+    if prefix:
+      stmt = stmt.where(
+        or_(
+          Target.server_tag.startswith(prefix, autoescape=True),
+          Target.name.startswith(prefix, autoescape=True),
+        )
+      )
+
+    if count:
+      total = await db.scalar(select(func.count()).select_from(stmt.subquery()))
+      response.headers["X-Total-Count"] = str(total)
+
+    stmt = stmt.order_by(Target.server_tag)
+    if cursor is not None:
+      # Keyset paging: seek past the last tag of the previous page through the
+      # server_tag index instead of counting off skipped rows
+      stmt = stmt.where(Target.server_tag > decode_cursor(cursor))
+    elif skip:
+      stmt = stmt.offset(skip)
+    result = await db.execute(stmt.limit(limit + 1))
     targets = result.scalars().all()
+
+    if len(targets) > limit:
+      targets = targets[:limit]
+      response.headers["X-Next-Cursor"] = encode_cursor(targets[-1].server_tag)
     return targets
 
 # Get a specific target by ID
@@ -86,6 +146,7 @@ async def update_target(target_id: uuid.UUID, target: TargetUpdate, db: AsyncSes
         setattr(db_target, key, value)
     
     await db.commit()
+    target_configs.invalidate(target_id)
     await db.refresh(db_target)
     return db_target
 
@@ -100,6 +161,7 @@ async def delete_target(target_id: uuid.UUID, db: AsyncSession = Depends(get_tar
     
     await db.delete(db_target)
     await db.commit()
+    target_configs.invalidate(target_id)
     return db_target
 
 # Delete all targets
@@ -116,5 +178,6 @@ async def delete_all_targets(db: AsyncSession = Depends(get_target_db)):
         count += 1
     
     await db.commit()
+    target_configs.invalidate()
     return {"deleted": count, "message": f"Successfully deleted {count} targets"}
 
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import threading
+from time import monotonic
+from typing import Any, Dict, Optional
+
+from app.db import Target
+
+config_path = os.path.join(os.path.dirname(__file__), "../../config.json")
+with open(config_path) as config_file:
+    config = json.load(config_file)
+
+
+def env_file_path(server_path: str) -> str:
+    config_file_path = server_path + "/atomiton.env"
+    if not os.path.exists(config_file_path):
+        config_file_path = "./atomiton.env"
+    return config_file_path
+
+
+def _signature(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (os.path.abspath(path), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def read_target_config(db_target: Target) -> Dict[str, Any]:
+    logging.info(f"Using server path: {db_target.server_path}")
+    config_file_path = env_file_path(db_target.server_path)
+    with open(config_file_path, "r") as f:
+        lines = f.readlines()
+        logging.info(f"Config Env:    {lines[1].strip()}")
+        logging.info(f"Config Port:   {lines[3].strip()}")
+        logging.info(f"Config Source: {lines[5].strip()}")
+        return {
+            "Target": {
+                "server_name": db_target.name,
+                "server_tag": db_target.server_tag,
+                "server_alias": db_target.server_alias,
+                "server_path": db_target.server_path,
+                "server_port": db_target.server_port,
+                "server_role": db_target.server_role,
+            },
+            "env": lines[1].strip(),
+            "port": lines[3].strip(),
+            "source": lines[11].strip(),
+            "database": lines[5].strip(),
+        }
+
+
+# Resolved deployment config per target. An entry is dropped when the target is
+# changed through /targets, when its atomiton.env changes on disk (path, inode,
+# mtime or size), or after `ttl` seconds as a backstop for other workers' edits.
+class TargetConfigCache:
+    def __init__(self, ttl: float = 60):
+        self.ttl = ttl
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, target_id) -> Optional[Dict[str, Any]]:
+        key = str(target_id)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            cached_at, server_path, signature, config = entry
+            if (
+                monotonic() - cached_at < self.ttl
+                and _signature(env_file_path(server_path)) == signature
+            ):
+                self.hits += 1
+                return config
+            self.invalidate(target_id)
+        self.misses += 1
+        return None
+
+    def load(self, db_target: Target) -> Dict[str, Any]:
+        signature = _signature(env_file_path(db_target.server_path))
+        config = read_target_config(db_target)
+        with self._lock:
+            self._entries[str(db_target.id)] = (
+                monotonic(),
+                db_target.server_path,
+                signature,
+                config,
+            )
+        return config
+
+    def invalidate(self, target_id=None):
+        with self._lock:
+            if target_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(target_id), None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+target_configs = TargetConfigCache(
+    ttl=config["backend"].get("deployment", {}).get("config_cache_ttl", 60)
+)
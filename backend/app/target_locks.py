@@ -0,0 +1,96 @@
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class TargetBusy(Exception):
+    def __init__(self, target_id: str, operation: Optional[str]):
+        self.target_id = target_id
+        self.operation = operation
+        super().__init__(
+            f"Target {target_id} is busy with {operation or 'another operation'}"
+        )
+
+
+# One deployment operation at a time per target. A caller asking for the same
+# operation with the same parameters as one already queued or running on that
+# target shares its result instead of running it again; any other operation
+# waits its turn, or is refused with TargetBusy when the caller will not wait.
+class TargetLocks:
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._ops: Dict[str, Dict[str, asyncio.Task]] = {}
+        self._active: Dict[str, str] = {}
+        self.coalesced = 0
+        self.rejected = 0
+
+    @staticmethod
+    def _op_key(operation: str, params: Dict[str, Any]) -> str:
+        return f"{operation}:{json.dumps(params, sort_keys=True, default=str)}"
+
+    def busy(self, target_id) -> bool:
+        return bool(self._ops.get(str(target_id)))
+
+    async def run(
+        self,
+        target_id,
+        operation: str,
+        params: Dict[str, Any],
+        factory: Callable[[], Awaitable[Any]],
+        wait: bool = True,
+    ) -> Any:
+        key = str(target_id)
+        op_key = self._op_key(operation, params)
+        ops = self._ops.setdefault(key, {})
+        task = ops.get(op_key)
+        if task is not None:
+            self.coalesced += 1
+            logging.info(f"[Target Lock] Joining in-flight {operation} on {key}")
+        else:
+            if not wait and ops:
+                self.rejected += 1
+                raise TargetBusy(key, self._active.get(key))
+            # The operation runs in its own task so that a caller going away
+            # never stops a deployment halfway for everyone else
+            task = asyncio.ensure_future(self._execute(key, operation, op_key, factory))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            ops[op_key] = task
+        return await asyncio.shield(task)
+
+    async def _execute(
+        self,
+        key: str,
+        operation: str,
+        op_key: str,
+        factory: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                self._active[key] = operation
+                try:
+                    return await factory()
+                finally:
+                    del self._active[key]
+        finally:
+            ops = self._ops.get(key, {})
+            ops.pop(op_key, None)
+            if not ops:
+                # Nobody is waiting on this target any more
+                self._ops.pop(key, None)
+                self._locks.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": dict(self._active),
+            "waiting": {
+                key: len(ops) - (1 if key in self._active else 0)
+                for key, ops in self._ops.items()
+            },
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
+
+
+target_locks = TargetLocks()
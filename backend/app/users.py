@@ -1,8 +1,10 @@
 import uuid
-from typing import Optional, Dict
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
 import os
 import json
 from datetime import datetime, timedelta
+from time import monotonic
 
 from fastapi import Depends, Request
 from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin, models
@@ -12,8 +14,12 @@ from fastapi_users.authentication import (
     JWTStrategy,
 )
 from fastapi_users.db import SQLAlchemyUserDatabase
+import jwt
+from sqlalchemy import delete, inspect
+from sqlalchemy.orm import make_transient_to_detached
 
-from app.db import User, get_user_db
+from app import db
+from app.db import AuthToken, User, get_user_db
 
 config_path = os.path.join(os.path.dirname(__file__), "../../config.json")
 with open(config_path) as config_file:
@@ -21,8 +27,155 @@ with open(config_path) as config_file:
 
 SECRET = config["backend"]["secret_key"]
 
-# Add token cache to store active tokens
-active_tokens: Dict[str, dict] = {}
+auth_config = config["backend"].get("auth", {})
+TOKEN_LIFETIME = auth_config.get("token_lifetime", 3600)
+# A cached token is only handed out again while it has this long left to live
+TOKEN_REUSE_MARGIN = min(300, TOKEN_LIFETIME // 2)
+
+
+# One reusable token per user. The auth_token table is the copy every worker
+# shares; each process keeps the entries it used recently in a small LRU in
+# front of it, trusted for `ttl` seconds before it asks the table again.
+class TokenCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # user id -> (token, expires_at, cached at)
+        self._entries: OrderedDict[str, Tuple[str, datetime, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remember(self, user_id: str, token: str, expires_at: datetime):
+        self._entries[user_id] = (token, expires_at, monotonic())
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _local(self, user_id: str) -> Optional[str]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        token, expires_at, cached_at = entry
+        if (
+            monotonic() - cached_at > self.ttl
+            or datetime.now() + timedelta(seconds=TOKEN_REUSE_MARGIN) >= expires_at
+        ):
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return token
+
+    async def get(self, user_id: str) -> Optional[str]:
+        token = self._local(user_id)
+        if token is not None:
+            self.hits += 1
+            return token
+        self.misses += 1
+        reusable_after = datetime.now() + timedelta(seconds=TOKEN_REUSE_MARGIN)
+        async with db.async_session_maker() as session:
+            row = await session.get(AuthToken, uuid.UUID(user_id))
+        if row is None or row.expires_at <= reusable_after:
+            return None
+        self._remember(user_id, row.token, row.expires_at)
+        return row.token
+
+    # Stores `token` unless another worker stored a still-usable token for the
+    # same user first; returns whichever token won so every worker agrees
+    async def put(self, user_id: str, token: str, expires_at: datetime) -> str:
+        reusable_after = datetime.now() + timedelta(seconds=TOKEN_REUSE_MARGIN)
+        stmt = db.upsert(AuthToken).values(
+            user_id=uuid.UUID(user_id), token=token, expires_at=expires_at
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AuthToken.user_id],
+            set_={"token": token, "expires_at": expires_at},
+            where=AuthToken.expires_at <= reusable_after,
+        )
+        async with db.async_session_maker() as session:
+            await session.execute(stmt)
+            await session.commit()
+            row = await session.get(AuthToken, uuid.UUID(user_id))
+        self._remember(user_id, row.token, row.expires_at)
+        return row.token
+
+    async def prune(self) -> int:
+        async with db.async_session_maker() as session:
+            result = await session.execute(
+                delete(AuthToken).where(AuthToken.expires_at <= datetime.now())
+            )
+            await session.commit()
+        return result.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(
+    max_entries=auth_config.get("token_cache_size", 1024),
+    ttl=auth_config.get("token_cache_ttl", 30),
+)
+
+
+# Verified token -> the user it belongs to, so an authenticated request skips
+# decoding the JWT and loading the user row. Entries hold column values, not
+# ORM objects: every hit builds its own detached User, so concurrent requests
+# never share one instance between their sessions. Each process has its own
+# cache and only drops entries for changes it made itself: a user deactivated
+# or changed through another worker is still served from here for up to `ttl`
+# seconds (auth.user_cache_ttl; 0 turns the cache off).
+class UserCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 10):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # token -> (user id, column values, token exp as a timestamp, cached at)
+        self._entries: OrderedDict[str, Tuple[str, dict, float, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[User]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        _, values, exp, cached_at = entry
+        if monotonic() - cached_at > self.ttl or datetime.now().timestamp() >= exp:
+            del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        user = User(**values)
+        make_transient_to_detached(user)
+        return user
+
+    def put(self, token: str, user: User, exp: float):
+        values = {
+            attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs
+        }
+        self._entries[token] = (str(user.id), values, exp, monotonic())
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        user_id = str(user_id)
+        for token in [t for t, e in self._entries.items() if e[0] == user_id]:
+            del self._entries[token]
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserCache(
+    max_entries=auth_config.get("user_cache_size", 1024),
+    ttl=auth_config.get("user_cache_ttl", 10),
+)
 
 
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
@@ -32,17 +185,27 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     async def on_after_login(
         self, user: User, request: Optional[Request] = None, response=None
     ):
-        # Check if user already has a valid token
-        user_id = str(user.id)
-        if user_id in active_tokens:
-            token_data = active_tokens[user_id]
-            if datetime.now() < token_data["expires_at"]:
-                # Return existing token instead of generating new one
-                return token_data["token"]
-
-        # If no valid token exists, the new token will be generated by the auth backend
+        # Token reuse is handled by CustomJWTStrategy.write_token
         print(f"User {user.id} logged in.")
 
+    # Changes made through this manager (the /users router, password reset,
+    # verification) must not be hidden by the user cache
+    async def on_after_update(
+        self, user: User, update_dict: Dict, request: Optional[Request] = None
+    ):
+        user_cache.invalidate(user.id)
+
+    async def on_after_delete(self, user: User, request: Optional[Request] = None):
+        user_cache.invalidate(user.id)
+
+    async def on_after_reset_password(
+        self, user: User, request: Optional[Request] = None
+    ):
+        user_cache.invalidate(user.id)
+
+    async def on_after_verify(self, user: User, request: Optional[Request] = None):
+        user_cache.invalidate(user.id)
+
     async def on_after_register(self, user: User, request: Optional[Request] = None):
         print(f"User {user.id} has registered.")
 
@@ -63,33 +226,43 @@ async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db
 
 # Custom JWT Strategy that checks for existing tokens
 class CustomJWTStrategy(JWTStrategy[models.UP, models.ID]):
+    async def read_token(
+        self, token: Optional[str], user_manager: BaseUserManager[models.UP, models.ID]
+    ) -> Optional[models.UP]:
+        if token is None:
+            return None
+        user = user_cache.get(token)
+        if user is not None:
+            return user
+
+        user = await super().read_token(token, user_manager)
+        if user is not None:
+            # The signature was just verified; only the expiry is needed here
+            claims = jwt.decode(token, options={"verify_signature": False})
+            user_cache.put(token, user, claims.get("exp", 0))
+        return user
+
     async def write_token(self, user: models.UP) -> str:
         user_id = str(user.id)
 
         # Check if user already has a valid token
-        if user_id in active_tokens:
-            return active_tokens[user_id]["token"]
-            # token_data = active_tokens[user_id]
-            # if datetime.now() < token_data["expires_at"]:
-            #     return token_data["token"]
+        token = await token_cache.get(user_id)
+        if token is not None:
+            return token
 
         # Generate new token
+        expires_at = datetime.now() + timedelta(seconds=self.lifetime_seconds or 0)
         token = await super().write_token(user)
 
         # Store token in cache
-        active_tokens[user_id] = {
-            "token": token,
-            "expires_at": datetime.now() + timedelta(days=365),
-        }
-
-        return token
+        return await token_cache.put(user_id, token, expires_at)
 
 
 bearer_transport = BearerTransport(tokenUrl="auth/jwt/login")
 
 
 def get_jwt_strategy() -> CustomJWTStrategy:
-    return CustomJWTStrategy(secret=SECRET, lifetime_seconds=3600)
+    return CustomJWTStrategy(secret=SECRET, lifetime_seconds=TOKEN_LIFETIME)
 
 
 auth_backend = AuthenticationBackend(
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# Compares the default SQLite settings with the profile from config.json on a
+# scratch database: concurrent writers insert and update targets while
+# readers run the filtered lookups the API does.
+#
+#   python script/db_benchmark.py [--writers 8] [--readers 16] [--seconds 5]
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import uuid
+from time import perf_counter
+
+# Add the parent directory to the path to import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.db import SQLITE_PROFILE, Base, Target, create_missing_indexes, make_engine
+
+DEFAULT_PROFILE = {
+    "journal_mode": None,
+    "synchronous": None,
+    "cache_size": None,
+    "mmap_size": None,
+    "busy_timeout": None,
+    "temp_store": None,
+}
+ROLES = ["APP", "BE", "UI", "DB"]
+
+
+async def run(profile, writers, readers, seconds, seed_targets):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = make_engine(f"sqlite+aiosqlite:///{path}", profile)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(create_missing_indexes)
+    async with session_maker() as session:
+        session.add_all(
+            Target(
+                server_tag=f"T{i}",
+                server_role=ROLES[i % len(ROLES)],
+                server_status=i % 3 != 0,
+            )
+            for i in range(seed_targets)
+        )
+        await session.commit()
+
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    deadline = perf_counter() + seconds
+
+    async def writer():
+        while perf_counter() < deadline:
+            try:
+                async with session_maker() as session:
+                    if random.random() < 0.5:
+                        session.add(Target(server_tag=f"W{uuid.uuid4().hex}"))
+                    else:
+                        await session.execute(
+                            update(Target)
+                            .where(
+                                Target.server_tag
+                                == f"T{random.randrange(seed_targets)}"
+                            )
+                            .values(server_status=random.random() < 0.5)
+                        )
+                    await session.commit()
+                counts["writes"] += 1
+            except OperationalError:
+                counts["locked"] += 1
+
+    async def reader():
+        while perf_counter() < deadline:
+            try:
+                async with session_maker() as session:
+                    await session.execute(
+                        select(Target)
+                        .where(Target.server_role == random.choice(ROLES))
+                        .where(Target.server_status.is_(True))
+                        .limit(50)
+                    )
+                counts["reads"] += 1
+            except OperationalError:
+                counts["locked"] += 1
+
+    started = perf_counter()
+    await asyncio.gather(
+        *(writer() for _ in range(writers)), *(reader() for _ in range(readers))
+    )
+    elapsed = perf_counter() - started
+    await engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return {
+        "reads/s": round(counts["reads"] / elapsed),
+        "writes/s": round(counts["writes"] / elapsed),
+        "locked errors": counts["locked"],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--targets", type=int, default=5000)
+    args = parser.parse_args()
+
+    for name, profile in (("default", DEFAULT_PROFILE), ("profile", SQLITE_PROFILE)):
+        result = await run(
+            profile, args.writers, args.readers, args.seconds, args.targets
+        )
+        print(f"{name:>8}: {result}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())